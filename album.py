@@ -0,0 +1,111 @@
+import asyncio
+from collections import OrderedDict
+import config
+
+
+class AlbumAssembler:
+    """Collects the parts of Telegram albums and flushes each album exactly once"""
+
+    def __init__(self, on_album,
+                 delay=config.ALBUM_DEBOUNCE_SECONDS,
+                 max_age=config.ALBUM_MAX_AGE_SECONDS,
+                 max_pending=config.ALBUM_MAX_PENDING,
+                 max_parts=config.ALBUM_MAX_PARTS):
+        """
+        Initialize the album assembler
+
+        Args:
+            on_album: Coroutine function called as on_album(events, context) once per album
+            delay: Quiet period after the last received part before flushing
+            max_age: Maximum time an incomplete album is held before flushing
+            max_pending: Maximum number of albums assembled at once
+            max_parts: Number of parts after which an album is flushed immediately
+        """
+        self.on_album = on_album
+        self.delay = delay
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self.max_parts = max_parts
+        self.pending = OrderedDict()  # grouped_id -> {events, context, first_seen, timer}
+        self.tasks = {}  # task running on_album -> chat_id
+
+    def add(self, event, context=None):
+        """
+        Add an album part
+
+        Args:
+            event: Telethon NewMessage event with a grouped_id
+            context: Arbitrary value passed through to on_album (first part wins)
+        """
+        grouped_id = event.message.grouped_id
+        loop = asyncio.get_running_loop()
+
+        group = self.pending.get(grouped_id)
+        if group is None:
+            # Keep memory bounded, flush the oldest album early
+            while len(self.pending) >= self.max_pending:
+                self._flush(next(iter(self.pending)))
+            group = {
+                'events': [],
+                'context': context,
+                'first_seen': loop.time(),
+                'timer': None,
+            }
+            self.pending[grouped_id] = group
+
+        group['events'].append(event)
+        if group['timer']:
+            group['timer'].cancel()
+
+        if len(group['events']) >= self.max_parts:
+            self._flush(grouped_id)
+            return
+
+        # Debounce, but never hold an album longer than max_age
+        deadline = group['first_seen'] + self.max_age
+        when = min(loop.time() + self.delay, deadline)
+        group['timer'] = loop.call_at(when, self._flush, grouped_id)
+
+    async def flush_chat(self, chat_id, keep=None):
+        """
+        Flush the pending albums of a chat and wait until on_album handled them
+
+        Telegram delivers the parts of an album back to back, so once another
+        message of the chat arrives, its earlier albums are complete. Flushing
+        them first keeps them ahead of that message.
+
+        Args:
+            chat_id: Telegram chat ID
+            keep: grouped_id of the album that is still being received
+        """
+        for grouped_id, group in list(self.pending.items()):
+            if grouped_id != keep and group['events'][0].chat_id == chat_id:
+                self._flush(grouped_id)
+        tasks = [task for task, task_chat_id in self.tasks.items() if task_chat_id == chat_id]
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def flush_all(self):
+        """Flush every pending album and wait until on_album handled them, e.g. at shutdown"""
+        for grouped_id in list(self.pending):
+            self._flush(grouped_id)
+        if self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+    def _flush(self, grouped_id):
+        """Remove an album from the pending set and hand it to on_album"""
+        group = self.pending.pop(grouped_id, None)
+        if group is None:
+            return
+        if group['timer']:
+            group['timer'].cancel()
+
+        events = sorted(group['events'], key=lambda e: e.message.id)
+        task = asyncio.create_task(self.on_album(events, group['context']))
+        self.tasks[task] = events[0].chat_id
+        task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task):
+        self.tasks.pop(task, None)
+        if not task.cancelled() and task.exception():
+            print(f"Failed to forward album: {task.exception()!r}")
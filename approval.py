@@ -0,0 +1,51 @@
+import discord
+
+
+class ApproveButton(discord.ui.DynamicItem[discord.ui.Button], template=r"approve:(?P<index>[0-9]+)"):
+    """
+    Approve button of one embed in a batched approval message
+
+    The custom id carries the embed index, so the buttons keep working after
+    a restart without any per-message state. A click is dispatched as the
+    "embed_approval" client event with (interaction, index).
+    """
+
+    def __init__(self, index):
+        super().__init__(
+            discord.ui.Button(
+                label=f"✅ {index + 1}",
+                style=discord.ButtonStyle.success,
+                custom_id=f"approve:{index}",
+            )
+        )
+        self.index = index
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["index"]))
+
+    async def callback(self, interaction):
+        interaction.client.dispatch("embed_approval", interaction, self.index)
+
+
+def approval_view(indexes):
+    """
+    Build the approve buttons for the given embed indexes
+
+    Args:
+        indexes: Indexes of the embeds that still need approval
+
+    Returns:
+        discord.ui.View with one ApproveButton per index
+    """
+    view = discord.ui.View(timeout=None)
+    for index in indexes:
+        view.add_item(ApproveButton(index))
+    return view
+
+
+def batch_footer(footer, index):
+    """Turn the approval footer of a single forward into the one of embed index in a batch"""
+    parts = footer.split(" | ")
+    parts[0] = f"Press ✅ {index + 1} to approve"
+    return " | ".join(parts)
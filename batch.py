@@ -0,0 +1,97 @@
+import asyncio
+import config
+
+
+class EmbedBatcher:
+    """
+    Packs consecutive embeds for the same channel into multi-embed posts
+
+    A batch is sent once its window has passed since its first embed, as soon
+    as it holds MAX_EMBEDS embeds, or earlier if the next embed would push it
+    over Discord's combined embed character budget. Batches of one channel
+    are sent in order.
+    """
+
+    MAX_EMBEDS = 10    # Embeds per Discord message
+    MAX_CHARS = 6000   # Combined characters of all embeds of a message
+
+    def __init__(self, on_batch, window=config.TEXT_BATCH_SECONDS):
+        """
+        Initialize the batcher
+
+        Args:
+            on_batch: Coroutine function called as on_batch(channel, items) with
+                a list of (embed, context) pairs, once per batch
+            window: Seconds a batch collects embeds after its first one
+        """
+        self.on_batch = on_batch
+        self.window = window
+        self.pending = {}  # channel id -> {channel, items, chars, timer}
+        self.sending = {}  # channel id -> task sending the channel's last batch
+
+    def add(self, channel, embed, context=None):
+        """
+        Add an embed to the channel's batch
+
+        Args:
+            channel: Discord channel the embed is posted to
+            embed: discord.Embed
+            context: Arbitrary value passed through to on_batch
+        """
+        chars = len(embed)
+        batch = self.pending.get(channel.id)
+        if batch is not None and batch['chars'] + chars > self.MAX_CHARS:
+            self._flush(channel.id)
+            batch = None
+
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = {
+                'channel': channel,
+                'items': [],
+                'chars': 0,
+                'timer': loop.call_later(self.window, self._flush, channel.id),
+            }
+            self.pending[channel.id] = batch
+
+        batch['items'].append((embed, context))
+        batch['chars'] += chars
+        if len(batch['items']) >= self.MAX_EMBEDS:
+            self._flush(channel.id)
+
+    async def drain(self, channel_id):
+        """Send the channel's batch now and wait until everything queued for it is sent"""
+        self._flush(channel_id)
+        task = self.sending.get(channel_id)
+        if task is not None:
+            await asyncio.wait([task])
+
+    async def drain_all(self):
+        """Send all pending batches and wait until they are sent, e.g. at shutdown"""
+        for channel_id in list(self.pending):
+            self._flush(channel_id)
+        if self.sending:
+            await asyncio.wait(list(self.sending.values()))
+
+    def _flush(self, channel_id):
+        """Remove a batch from the pending set and schedule it after the channel's previous one"""
+        batch = self.pending.pop(channel_id, None)
+        if batch is None:
+            return
+        batch['timer'].cancel()
+
+        previous = self.sending.get(channel_id)
+        task = asyncio.create_task(self._send(batch, previous))
+        self.sending[channel_id] = task
+        task.add_done_callback(lambda task: self._on_task_done(channel_id, task))
+
+    async def _send(self, batch, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await self.on_batch(batch['channel'], batch['items'])
+
+    def _on_task_done(self, channel_id, task):
+        if self.sending.get(channel_id) is task:
+            del self.sending[channel_id]
+        if not task.cancelled() and task.exception():
+            print(f"Failed to forward batched messages: {task.exception()!r}")
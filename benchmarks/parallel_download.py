@@ -0,0 +1,135 @@
+"""
+Benchmark of the parallel media download against Telethon's sequential stream
+
+Run from the repository root (the bot's .env must be present):
+
+    python -m benchmarks.parallel_download [megabytes]
+
+Telegram is replaced by a local mock: every GetFile request waits one
+round trip, then transfers its part over a link shared by all requests.
+The sequential download, the parallel download and a parallel download
+whose ranges fail (falling back to the sequential one) must all produce
+byte-identical output, and the parallel download must not hold more than
+config.MEDIA_SPOOL_MAX_BYTES in memory.
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+import config
+from media import download_media_file
+
+ROUND_TRIP_SECONDS = 0.04
+LINK_BYTES_PER_SECOND = 80e6
+
+
+class MockTelegramClient:
+    """Serves iter_download from an in-memory file with latency and a shared link"""
+
+    def __init__(self, data, fail_after=None):
+        """
+        Args:
+            data: Contents of the mock document
+            fail_after: Parts after which every parallel range fails, None to never fail
+        """
+        self.data = data
+        self.fail_after = fail_after
+        self.link = asyncio.Lock()
+
+    async def _request(self, offset, limit):
+        # Round trips of concurrent requests overlap, their transfers share the link
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        async with self.link:
+            chunk = self.data[offset:offset + limit]
+            await asyncio.sleep(len(chunk) / LINK_BYTES_PER_SECOND)
+        return chunk
+
+    async def iter_download(self, document, offset=0, limit=None, request_size=config.MEDIA_DOWNLOAD_PART_SIZE,
+                            file_size=None):
+        for part in range(limit):
+            if self.fail_after is not None and document is not None and part == self.fail_after:
+                raise ConnectionError("mock connection dropped")
+            chunk = await self._request(offset + part * request_size, request_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def mock_message(client):
+    """A Telethon message whose download_media streams sequentially from the mock"""
+    async def download_media(file, thumb=None):
+        parts = -(-len(client.data) // config.MEDIA_DOWNLOAD_PART_SIZE)
+        async for chunk in client.iter_download(None, limit=parts):
+            file.write(chunk)
+
+    return SimpleNamespace(
+        id=1,
+        client=client,
+        document=object(),
+        file=SimpleNamespace(size=len(client.data), name='video.mp4', ext='.mp4', mime_type='video/mp4'),
+        download_media=download_media,
+    )
+
+
+async def sequential(data):
+    buffer = tempfile.SpooledTemporaryFile(max_size=config.MEDIA_SPOOL_MAX_BYTES)
+    await mock_message(MockTelegramClient(data)).download_media(file=buffer)
+    return buffer
+
+
+async def parallel(data, fail_after=None):
+    file = await download_media_file(mock_message(MockTelegramClient(data, fail_after)))
+    return file.fp
+
+
+def digest(file):
+    """Hash a downloaded file in chunks, without reading it into memory at once"""
+    file.seek(0)
+    sha = hashlib.sha256()
+    while chunk := file.read(1024 * 1024):
+        sha.update(chunk)
+    return sha.digest()
+
+
+async def timed(download, data, *args):
+    """Run a download, returning (seconds, peak traced memory in bytes, identical)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    out = await download(data, *args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    identical = digest(out) == hashlib.sha256(data).digest()
+    out.close()
+    return elapsed, peak, identical
+
+
+async def main(megabytes=200):
+    size = megabytes * 1024 * 1024 + 12345  # Not a multiple of the part size
+    if size < config.MEDIA_PARALLEL_MIN_BYTES:
+        sys.exit(f"Needs at least MEDIA_PARALLEL_MIN_BYTES ({config.MEDIA_PARALLEL_MIN_BYTES} bytes)")
+    data = os.urandom(size)
+    print(f"{size / 1e6:.0f} MB, {ROUND_TRIP_SECONDS * 1000:.0f} ms per request, "
+          f"{LINK_BYTES_PER_SECOND / 1e6:.0f} MB/s link, {config.MEDIA_DOWNLOAD_PART_SIZE // 1024} KiB parts, "
+          f"{config.MEDIA_DOWNLOAD_WORKERS} workers")
+
+    seq_time, seq_peak, seq_ok = await timed(sequential, data)
+    par_time, par_peak, par_ok = await timed(parallel, data)
+    fallback_time, fallback_peak, fallback_ok = await timed(parallel, data, 3)
+    print(f"sequential {size / seq_time / 1e6:6.1f} MB/s  peak {seq_peak / 1e6:6.1f} MB  identical={seq_ok}")
+    print(f"parallel   {size / par_time / 1e6:6.1f} MB/s  peak {par_peak / 1e6:6.1f} MB  identical={par_ok}"
+          f"  ({seq_time / par_time:.1f}x)")
+    print(f"fallback   {size / fallback_time / 1e6:6.1f} MB/s  peak {fallback_peak / 1e6:6.1f} MB  identical={fallback_ok}")
+    if not (seq_ok and par_ok and fallback_ok):
+        sys.exit("Downloaded data differs from the source")
+    if max(par_peak, fallback_peak) > config.MEDIA_SPOOL_MAX_BYTES:
+        sys.exit(f"The parallel download held more than MEDIA_SPOOL_MAX_BYTES "
+                 f"({config.MEDIA_SPOOL_MAX_BYTES / 1e6:.1f} MB) in memory")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,89 @@
+"""
+Benchmark of the vectorized roster post-processing against the row-wise version it replaced
+
+Run from the repository root (the bot's .env must be present):
+
+    python -m benchmarks.roster_transform [rows]
+
+Checks that priorities, start times and "name (time)" labels are identical
+to the apply/iterrows implementations, then prints the timings of both.
+"""
+import random
+import sys
+import timeit
+import pandas as pd
+from roster import position_priority, start_time_minutes, shift_labels
+
+
+# Row-wise implementations as they were before the transformation stage
+
+def position_priority_rowwise(position):
+    pos_lower = position.lower()
+
+    if 'barista' in pos_lower and ('dopoledne' in pos_lower or 'vikend' in pos_lower and 'odpoledne' not in pos_lower and 'sanitace' not in pos_lower):
+        return 1
+    elif 'prisluha' in pos_lower and ('dopoledne' in pos_lower or 'vikend' in pos_lower and 'odpoledne' not in pos_lower):
+        return 2
+    elif 'barista' in pos_lower:
+        return 3
+    elif 'prisluha' in pos_lower:
+        return 4
+    else:
+        return 5
+
+
+def start_time_rowwise(time_str):
+    try:
+        start = time_str.split('-')[0].strip()
+        hours, minutes = start.split(':')
+        return int(hours) * 60 + int(minutes)
+    except:
+        return 9999
+
+
+def labels_rowwise(df):
+    return [f"{row['name']} ({row['time']})" for _, row in df.iterrows()]
+
+
+def synthetic_roster(rows, seed=1):
+    """Build a roster frame with the position and time spellings seen on the IS pages"""
+    rng = random.Random(seed)
+    positions = [
+        'barista_dopoledne', 'prisluha_dopoledne', 'barista_odpoledne', 'prisluha_odpoledne',
+        'barista_vikend', 'prisluha_vikend_odpoledne', 'barista_vikend_sanitace', 'Barista VIKEND', 'jine',
+    ]
+    times = ['7:30 - 14:00', '8:00 - 12:00', ' 7 : 30-8', '12:00 - 20:00', '9:00', '', None, 'abc', '8:00:00 - 9']
+    return pd.DataFrame({
+        'name': [f"Jmeno{rng.randrange(60)} Prijmeni" for _ in range(rows)],
+        'position': [rng.choice(positions) for _ in range(rows)],
+        'time': [rng.choice(times) for _ in range(rows)],
+    })
+
+
+def best_of(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(rows=100_000):
+    df = synthetic_roster(rows)
+
+    assert position_priority(df['position']).tolist() == df['position'].apply(position_priority_rowwise).tolist()
+    assert start_time_minutes(df['time']).tolist() == df['time'].apply(start_time_rowwise).tolist()
+    assert shift_labels(df).tolist() == labels_rowwise(df)
+    print(f"{rows} rows, results identical to the row-wise versions")
+
+    benchmarks = [
+        ("position priority", lambda: df['position'].apply(position_priority_rowwise),
+         lambda: position_priority(df['position'])),
+        ("start time", lambda: df['time'].apply(start_time_rowwise),
+         lambda: start_time_minutes(df['time'])),
+        ("labels", lambda: labels_rowwise(df), lambda: shift_labels(df)),
+    ]
+    for name, rowwise, vectorized in benchmarks:
+        before = best_of(rowwise, repeat=3)
+        after = best_of(vectorized)
+        print(f"{name:18} {before * 1000:8.1f} ms -> {after * 1000:7.1f} ms  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,98 @@
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with optional per-entry TTL and weight budget"""
+
+    def __init__(self, maxsize, ttl=None, max_weight=None, weigh=None):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize: Maximum number of entries
+            ttl: Seconds after which an entry expires, None to never expire
+            max_weight: Maximum total weight of all entries, None for no limit
+            weigh: Function returning the weight of a value (e.g. its size in bytes)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh or (lambda value: 1)
+        self.entries = OrderedDict()  # key -> (expires_at, weight, value)
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, _, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.evictions += 1
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Store value under key, evicting the least recently used entries if full
+
+        Returns:
+            bool: False if the value alone exceeds max_weight and was not stored
+        """
+        weight = self.weigh(value)
+        self._remove(key)
+        if self.max_weight is not None and weight > self.max_weight:
+            return False
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (expires_at, weight, value)
+        self.weight += weight
+        while len(self.entries) > self.maxsize or (
+            self.max_weight is not None and self.weight > self.max_weight
+        ):
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def pop(self, key, default=None):
+        """Remove key and return its value"""
+        entry = self._remove(key)
+        return default if entry is None else entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.weight = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[1]
+        return entry
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """Return hit/miss/eviction counters"""
+        return {
+            'size': len(self.entries),
+            'weight': self.weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
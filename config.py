@@ -33,12 +33,27 @@ PERSONAL_ID = int(os.getenv('PERSONAL_ID'))
 TESTING_ID = -1003456617977
 TESTING_TOPIC_ID = 2
 
+# Routing of monitored chats: chat id -> approval channel, embed color and
+# optional topic filter (only messages from 'topic_id' are forwarded)
+CHAT_ROUTES = {
+    KOFI_NEWS_ID: {
+        'approval_channel_id': APPROVAL_CHANNEL_NEWS_ID,
+        'color': 0x8800cc,
+    },
+    KOFI_FLYBOYS_ID: {
+        'approval_channel_id': APPROVAL_CHANNEL_FLYBOYS_ID,
+        'color': 0x0088cc,
+    },
+    KOFI_PROVOZ_ID: {
+        'approval_channel_id': APPROVAL_CHANNEL_PROVOZ_ID,
+        'color': 0xcc8800,
+        'topic_id': KOFI_PROVOZ_MAIN_ID,
+    },
+}
+DEFAULT_EMBED_COLOR = 0x00cc88
+
 # List of all chats to monitor
-MONITORED_CHATS = [
-    KOFI_NEWS_ID,
-    KOFI_FLYBOYS_ID,
-    KOFI_PROVOZ_ID,
-]
+MONITORED_CHATS = list(CHAT_ROUTES)
 
 # Login info for IS
 LOGIN = os.getenv('LOGIN')
@@ -63,5 +78,85 @@ CZECH_TO_ENGLISH_DAYS = {
 
 
 # File paths
-DOWNLOADS_DIR = "downloads"
-SESSION_NAME = "anon"
\ No newline at end of file
+SESSION_NAME = "anon"
+
+# Slash commands are only synced when their definitions change (or when forced)
+COMMAND_TREE_HASH_PATH = "command_tree.sha256"
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC', '').lower() in ('1', 'true', 'yes')
+
+# Media is buffered in memory and only spills to a temporary file past this size
+MEDIA_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Album assembly
+ALBUM_DEBOUNCE_SECONDS = 1.0   # Quiet period after the last part before an album is flushed
+ALBUM_MAX_AGE_SECONDS = 10.0   # Incomplete albums are flushed at the latest after this
+ALBUM_MAX_PENDING = 50         # Max albums assembled at once, the oldest is flushed early
+ALBUM_MAX_PARTS = 10           # Telegram albums hold at most 10 items
+
+# Text-only forwards arriving within this window are posted as one multi-embed
+# message with an approve button per embed, 0 posts every message on its own
+TEXT_BATCH_SECONDS = 2.0
+
+# Discord delivery retries, the delay before retry n is random in [0, min(MAX, BASE * 2^(n-1))]
+DELIVERY_MAX_ATTEMPTS = 5
+DELIVERY_BACKOFF_BASE_SECONDS = 2.0
+DELIVERY_BACKOFF_MAX_SECONDS = 300.0
+
+# Forwarding pipeline
+FORWARD_WORKERS = 4            # Chats are spread over this many concurrent workers
+FORWARD_QUEUE_SIZE = 100       # Max queued forwards per worker
+FORWARD_BACKPRESSURE = "block" # "block", "drop" or "spill" when a worker queue is full
+FORWARD_SHUTDOWN_SECONDS = 10  # Queued forwards get this long to finish at shutdown
+
+# Telegram lookup caches
+MESSAGE_CACHE_SIZE = 2000      # Recently seen messages kept for reply lookups
+MESSAGE_CACHE_TTL = 24 * 3600  # Seconds
+ENTITY_CACHE_SIZE = 1000       # Sender and chat entities
+ENTITY_CACHE_TTL = 3600        # Seconds
+PAGINATION_STATE_SIZE = 500      # Paginated messages whose page buttons keep working
+PAGINATION_STATE_TTL = 24 * 3600  # Seconds since the last page flip
+STATS_LOG_SECONDS = 3600       # Cache and delivery counters are printed this often, 0 to never print them
+
+# Upload limit per Discord message, used when the channel's guild (and its boost
+# level) is unknown. Larger media is posted as a preview thumbnail or a link.
+DISCORD_UPLOAD_LIMIT_BYTES = 10 * 1024 * 1024
+DISCORD_MAX_ATTACHMENTS = 10
+
+# Documents and videos from this size on are downloaded as several concurrent
+# GetFile requests instead of one sequential stream
+MEDIA_PARALLEL_MIN_BYTES = 10 * 1024 * 1024
+MEDIA_DOWNLOAD_WORKERS = 4               # Concurrent requests per download
+MEDIA_DOWNLOAD_PART_SIZE = 512 * 1024    # Bytes per request, a multiple of 4 KiB dividing 1 MiB
+
+# Images over the upload limit are downsized and re-encoded as JPEG/WebP in worker
+# processes instead of being posted as a thumbnail or link (requires Pillow)
+RECOMPRESS_IMAGES = True
+RECOMPRESS_WORKERS = 2
+RECOMPRESS_CPU_SECONDS = 5.0             # CPU time per image before giving up on it
+RECOMPRESS_TARGET_BYTES = 2 * 1024 * 1024  # Size a recompressed image must fit in
+RECOMPRESS_MAX_DIMENSION = 4096          # Max width and height of a recompressed image
+RECOMPRESS_MAX_INPUT_BYTES = 50 * 1024 * 1024  # Larger images are not downloaded for it
+RECOMPRESS_MIME_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/bmp', 'image/tiff')
+RECOMPRESS_CACHE_SIZE = 200              # Results kept by content hash
+RECOMPRESS_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Media kept after forwarding so approvals can re-post without downloading attachments
+MEDIA_CACHE_MAX_BYTES = 200 * 1024 * 1024
+MEDIA_CACHE_MAX_ENTRIES = 500
+MEDIA_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024   # Larger posts stay spooled and are downloaded again on approval
+
+# Forward ledger
+LEDGER_PATH = "forwards.sqlite3"
+LEDGER_FLUSH_SECONDS = 2.0     # Buffered ledger writes are committed this often
+LEDGER_BATCH_SIZE = 50         # ...or as soon as this many writes are pending
+CATCHUP_CONCURRENCY = 3        # Chats caught up in parallel at startup
+CATCHUP_WINDOW = 200           # Message IDs below the newest forward rechecked for gaps
+
+# IS scraper HTML parser: "auto" (lxml if installed), "lxml" or "bs4"
+SCRAPER_PARSER = "auto"
+SCRAPER_TIMEOUT_SECONDS = 30
+SCRAPE_INTERVAL_SECONDS = 30 * 60  # Background refresh period, 0 to only scrape at startup and on /scrape
+SCRAPE_JITTER_SECONDS = 60         # Random +- offset so refreshes do not line up
+SCRAPE_RETRY_SECONDS = 60          # Retry period while no scrape has succeeded yet
+ROSTER_DIFF_MAX_LINES = 50         # Roster change summaries are cut after this many lines
+SNAPSHOT_PATH = "roster.pickle"    # Last scraped roster, loaded at startup
@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import json
+import random
+import aiohttp
+import discord
+import config
+
+
+# Lower values are delivered first within a bucket
+PRIORITY_APPROVAL = 0
+PRIORITY_FORWARD = 1
+PRIORITY_ANNOUNCEMENT = 2
+PRIORITY_REACTION = 3
+
+
+class DeliveryFailed(Exception):
+    """A delivery was given up on after its retries (and dead-lettered if it had a dead letter)"""
+
+
+class DeliveryScheduler:
+    """
+    Sends Discord requests through one priority queue per rate-limit bucket
+
+    Every bucket (e.g. the messages of one channel) is served by a single
+    worker, so requests sharing a Discord rate limit never race each other
+    into 429s; different buckets run in parallel. Failed requests are retried
+    with exponential backoff and full jitter. Deliveries with the same key
+    are only performed once while one is pending (in flight, not persisted),
+    and deliveries that keep failing are stored as dead letters in the
+    ledger to be replayed later.
+    """
+
+    def __init__(self, ledger=None,
+                 max_attempts=config.DELIVERY_MAX_ATTEMPTS,
+                 backoff_base=config.DELIVERY_BACKOFF_BASE_SECONDS,
+                 backoff_max=config.DELIVERY_BACKOFF_MAX_SECONDS):
+        """
+        Initialize the scheduler
+
+        Args:
+            ledger: Optional ForwardLedger the dead letters are persisted in
+            max_attempts: Attempts per delivery before it is given up on
+            backoff_base: Upper bound of the first retry delay in seconds, doubled per retry
+            backoff_max: Upper bound of any retry delay in seconds
+        """
+        self.ledger = ledger
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queues = {}  # bucket -> asyncio.PriorityQueue
+        self.workers = {}  # bucket -> worker task
+        self.pending = {}  # key -> future of the delivery
+        self.replayers = {}  # dead letter kind -> coroutine function(payload)
+        self.sequence = itertools.count()  # Keeps equal priorities in submission order
+        self.retries = 0
+        self.failures = 0
+
+    def register_replay(self, kind, replay):
+        """
+        Register how dead letters of a kind are replayed
+
+        Args:
+            kind: Dead letter kind, e.g. 'forward'
+            replay: Coroutine function called with the dead letter's payload
+        """
+        self.replayers[kind] = replay
+
+    async def deliver(self, bucket, send, key=None, priority=PRIORITY_FORWARD, dead_letter=None):
+        """
+        Queue a request and wait for its result
+
+        Args:
+            bucket: Rate-limit bucket, e.g. ('messages', channel_id)
+            send: Function returning a new awaitable of the request for every attempt
+            key: Idempotency key, a delivery with the same key that is still
+                pending (queued or between retries) is joined instead of sending
+                again. Keys are not remembered once a delivery finished or across
+                restarts, so callers guard against repeats themselves: forwards
+                with the ledger claims, approvals with the ledger status.
+            priority: PRIORITY_* value
+            dead_letter: (kind, payload) stored if the delivery finally fails,
+                payload must be JSON serializable
+
+        Returns:
+            The result of the successful attempt
+
+        Raises:
+            DeliveryFailed: If all attempts failed or the error is not retryable
+        """
+        if key is not None and key in self.pending:
+            return await asyncio.shield(self.pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self.pending[key] = future
+        future.add_done_callback(lambda future: self._on_done(key, future))
+        self._queue(bucket).put_nowait((priority, next(self.sequence), send, key, dead_letter, future))
+        # Shielded, a cancelled caller does not abort the delivery
+        return await asyncio.shield(future)
+
+    def _queue(self, bucket):
+        queue = self.queues.get(bucket)
+        if queue is None:
+            queue = self.queues[bucket] = asyncio.PriorityQueue()
+            self.workers[bucket] = asyncio.create_task(self._worker(bucket, queue))
+        return queue
+
+    def _on_done(self, key, future):
+        if key is not None and self.pending.get(key) is future:
+            del self.pending[key]
+        if not future.cancelled():
+            future.exception()  # Retrieved, callers may have given up waiting
+
+    async def _worker(self, bucket, queue):
+        while True:
+            _, _, send, key, dead_letter, future = await queue.get()
+            try:
+                result = await self._attempt(bucket, send)
+            except Exception as e:
+                self.failures += 1
+                name = f"Delivery {key}" if key else "Delivery"
+                print(f"{name} to {bucket} failed for good: {e!r}")
+                if dead_letter is not None:
+                    self._store_dead_letter(key, dead_letter, e)
+                if not future.done():
+                    future.set_exception(DeliveryFailed(f"Delivery to {bucket} failed: {e!r}"))
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
+
+    async def _attempt(self, bucket, send):
+        """Run send until it succeeds, backing off between attempts"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await send()
+            except Exception as e:
+                if attempt == self.max_attempts or not self.is_retryable(e):
+                    raise
+                # Full jitter keeps retries of many deliveries from arriving in lockstep
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                self.retries += 1
+                print(f"Delivery to {bucket} failed ({e!r}), retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def is_retryable(error):
+        """Rate limits, Discord server errors and network errors are worth another attempt"""
+        if isinstance(error, discord.HTTPException):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+    def _store_dead_letter(self, key, dead_letter, error):
+        kind, payload = dead_letter
+        if self.ledger is None:
+            print(f"No ledger, dropping failed {kind} delivery {payload}")
+            return
+        # Without a key the payload identifies the delivery, so repeated failures replace each other
+        key = key or f"{kind}:{json.dumps(payload, sort_keys=True)}"
+        self.ledger.add_dead_letter(key, kind, payload, repr(error))
+
+    async def replay(self):
+        """
+        Replay all stored dead letters
+
+        A dead letter is removed before its replay; if the replay fails
+        again, the delivery stores it anew.
+
+        Returns:
+            tuple: (replayed, failed) counts
+        """
+        if self.ledger is None:
+            return 0, 0
+
+        replayed = failed = 0
+        for key, kind, payload, error in self.ledger.dead_letters():
+            replay = self.replayers.get(kind)
+            if replay is None:
+                continue
+            self.ledger.remove_dead_letter(key)
+            try:
+                await replay(payload)
+                replayed += 1
+            except Exception as e:
+                print(f"Replaying {key} failed: {e!r}")
+                if not self.ledger.has_dead_letter(key):
+                    self.ledger.add_dead_letter(key, kind, payload, repr(e))
+                failed += 1
+        return replayed, failed
+
+    def stats(self):
+        """Return queue depths and retry/failure counters"""
+        return {
+            'queued': sum(queue.qsize() for queue in self.queues.values()),
+            'buckets': len(self.queues),
+            'retries': self.retries,
+            'failures': self.failures,
+        }
+
+    def close(self):
+        """Stop the bucket workers"""
+        for task in self.workers.values():
+            task.cancel()
+        self.workers = {}
+        self.queues = {}
@@ -1,32 +1,41 @@
 import discord
 from discord import app_commands
 import config
-import requests
-from bs4 import BeautifulSoup
 import asyncio
-import re
-import pandas as pd
+import hashlib
+import json
+import weakref
 from datetime import datetime
+from approval import ApproveButton, approval_view
+from cache import LRUCache
+from delivery import DeliveryScheduler, DeliveryFailed, PRIORITY_APPROVAL, PRIORITY_ANNOUNCEMENT
+from media import files_from_payload
+from scraper import ISClient, ScrapeCoordinator, page_fingerprint
+
 
 class DiscordHandler:
     """Handles Discord events including message approvals"""
     
-    def __init__(self, client):
+    def __init__(self, client, media_cache=None, ledger=None, delivery=None):
         """
         Initialize the Discord handler
         
         Args:
             client: Discord client instance
+            media_cache: Optional cache of forwarded media, keyed by approval message id
+            ledger: Optional ForwardLedger approvals are recorded in
+            delivery: DeliveryScheduler shared with the Telegram handler (default: a new one)
         """
         self.client = client
-        self.payload = {
-            'login': str(config.LOGIN),
-            'heslo': str(config.PASSWORD),
-            'ok': 'Přihlásit se'
-        }
-        self.shifts = pd.DataFrame()
-        self.flyboys = pd.DataFrame()
-        self.paginated_messages = {}  # message_id -> {mode, index, ...}
+        self.media_cache = media_cache
+        self.ledger = ledger
+        self.delivery = delivery or DeliveryScheduler(ledger)
+        self.delivery.register_replay('approval', self.replay_approval)
+        self.is_client = ISClient(config.LOGIN, config.PASSWORD)
+        self.scrapes = ScrapeCoordinator(self._do_scrape, self._set_roster)
+        self._roster = None  # Loaded lazily, see the roster property
+        # message_id -> {mode, index, trucks/days, ...}, pages are rendered from the current roster
+        self.paginated_messages = LRUCache(config.PAGINATION_STATE_SIZE, config.PAGINATION_STATE_TTL)
 
         self.location_choices = [
             app_commands.Choice(name="Batch Brew", value="Batch Brew"),
@@ -61,6 +70,14 @@ class DiscordHandler:
         # Register event handlers
         self.client.event(self.on_ready)
         self.client.event(self.on_raw_reaction_add)
+        self.client.event(self.on_embed_approval)
+        self.client.add_dynamic_items(ApproveButton)
+        # Approvals of the same message run one at a time, message_id -> lock
+        self.approval_locks = weakref.WeakValueDictionary()
+
+        # One persistent view answers the page buttons of every paginated message
+        self.pagination_view = PaginationView(self._turn_page)
+        self.client.add_view(self.pagination_view)
 
 
 
@@ -69,19 +86,29 @@ class DiscordHandler:
         @self.client.tree.command(name="scrape", description="Scrape data from IS")
         async def scrape(interaction: discord.Interaction):
             await interaction.response.defer()
-            shifts, flyboys = await asyncio.to_thread(self._do_scrape)
-            if shifts is None:
-                await interaction.followup.send("Login failed")
+            roster = await self.scrapes.refresh()
+            if roster is None:
+                note = self._updated_note()
+                await interaction.followup.send(f"Login failed. {note}" if note else "Login failed")
             else:
-                self.shifts = shifts
-                self.flyboys = flyboys
-                await interaction.followup.send(f"Scraped {len(shifts)} shifts and {len(flyboys)} flyboys records")
+                await interaction.followup.send(
+                    f"Scraped {len(roster.shifts)} shifts and {len(roster.flyboys)} flyboys records. {self._updated_note()}"
+                )
+
+        @self.client.tree.command(name="replay-failed", description="Retry forwards and approvals that failed to post")
+        async def replay_failed(interaction: discord.Interaction):
+            await interaction.response.defer()
+            replayed, failed = await self.delivery.replay()
+            if not replayed and not failed:
+                await interaction.followup.send("Nothing to replay.")
+            else:
+                await interaction.followup.send(f"Replayed {replayed} failed deliveries, {failed} failed again.")
 
         @self.client.tree.command(name="today", description="Show shifts for today")
         @app_commands.describe(location="Which truck to show")
         @app_commands.choices(location=self.location_choices)
         async def today(interaction: discord.Interaction, location: app_commands.Choice[str]):
-            if self.shifts.empty:
+            if self.roster.shifts.empty:
                 await interaction.response.send_message("No shift data available. Please run /scrape first.")
                 return
             # Get today's day name in Czech
@@ -97,16 +124,16 @@ class DiscordHandler:
                 await interaction.response.send_message("Could not determine today's day.")
                 return
             
-            today_shifts = self.shifts[(self.shifts['truck'] == location.value) & (self.shifts['day'] == czech_day)]
+            today_shifts = self.roster.truck_day(location.value, czech_day)
             if today_shifts.empty:
                 await interaction.response.send_message(f"No shifts found for {location.value} today.")
                 return
 
-            await interaction.response.send_message(embed=self._create_embed(today_shifts, location.value, czech_day))
+            await interaction.response.send_message(embed=self._create_embed(location.value, czech_day))
 
         @self.client.tree.command(name="today-all", description="Show shifts for all trucks today")
         async def today_all(interaction: discord.Interaction):
-            if self.shifts.empty:
+            if self.roster.shifts.empty:
                 await interaction.response.send_message("No shift data available. Please run /scrape first.")
                 return
 
@@ -120,82 +147,59 @@ class DiscordHandler:
                 await interaction.response.send_message("Could not determine today's day.")
                 return
 
-            day_shifts = self.shifts[self.shifts['day'] == czech_day]
-            if day_shifts.empty:
+            trucks = self.roster.day_trucks(czech_day)
+            if not trucks:
                 await interaction.response.send_message("No shifts found for today.")
                 return
 
-            trucks = list(day_shifts['truck'].unique())
-            first_shifts = day_shifts[day_shifts['truck'] == trucks[0]]
-            embed = self._create_embed(first_shifts, trucks[0], czech_day)
-            embed.set_footer(text=f"{trucks[0]}  •  1 / {len(trucks)}")
-
-            await interaction.response.send_message(embed=embed)
-            message = await interaction.original_response()
-            await message.add_reaction("⬅️")
-            await message.add_reaction("➡️")
-
-            self.paginated_messages[message.id] = {
+            await self._send_paginated(interaction, {
                 "mode": "trucks",
                 "trucks": trucks,
                 "index": 0,
                 "czech_day": czech_day,
-                "day_shifts": day_shifts,
-            }
+            })
 
         @self.client.tree.command(name="week", description="Show shifts for a specific truck for the whole week")
         @app_commands.describe(location="Which truck to show")
         @app_commands.choices(location=self.location_choices)
         async def week(interaction: discord.Interaction, location: app_commands.Choice[str]):
-            if self.shifts.empty:
+            if self.roster.shifts.empty:
                 await interaction.response.send_message("No shift data available. Please run /scrape first.")
                 return
 
-            truck_shifts = self.shifts[self.shifts['truck'] == location.value]
-            if truck_shifts.empty:
+            days = self.roster.truck_days(location.value)
+            if not days:
                 await interaction.response.send_message(f"No shifts found for {location.value}.")
                 return
 
-            days = [d for d in config.DAY_ORDER if d in truck_shifts['day'].values]
-
-            first_day_shifts = truck_shifts[truck_shifts['day'] == days[0]]
-            embed = self._create_embed(first_day_shifts, location.value, days[0])
-            embed.set_footer(text=f"{days[0]}  •  1 / {len(days)}")
-
-            await interaction.response.send_message(embed=embed)
-            message = await interaction.original_response()
-            await message.add_reaction("⬅️")
-            await message.add_reaction("➡️")
-
-            self.paginated_messages[message.id] = {
+            await self._send_paginated(interaction, {
                 "mode": "days",
                 "days": days,
                 "index": 0,
                 "truck": location.value,
-                "truck_shifts": truck_shifts,
-            }
+            })
 
         @self.client.tree.command(name="day", description="Show shifts for a specific truck for a given day")
         @app_commands.describe(day="What day to show", location="Which truck to show")
         @app_commands.choices(day=self.day_choices, location=self.location_choices)
         async def day(interaction: discord.Interaction, day: app_commands.Choice[str], location: app_commands.Choice[str]):
-            if self.shifts.empty:
+            if self.roster.shifts.empty:
                 await interaction.response.send_message("No shift data available. Please run /scrape first.")
                 return
-            day_truck_shifts = self.shifts[(self.shifts['truck'] == location.value) & (self.shifts['day'] == day.value)]
+            day_truck_shifts = self.roster.truck_day(location.value, day.value)
             if day_truck_shifts.empty:
                 await interaction.response.send_message(f"No shifts found for {location.value} on {day.value}.")
                 return
-            embed = self._create_embed(day_truck_shifts, location.value, day.value)
+            embed = self._create_embed(location.value, day.value)
             await interaction.response.send_message(embed=embed)
 
         @self.client.tree.command(name="flyboy_sanitace", description="Show list of flyboys, that have sanitace this week")
         async def flyboy_sanitace(interaction: discord.Interaction):
-            if self.flyboys.empty:
+            if self.roster.flyboys.empty:
                 await interaction.response.send_message("No flyboys data. Please run /scrape first.")
                 return
 
-            friday_flyboys = self.flyboys[self.flyboys['day'] == 'Pátek']
+            friday_flyboys = self.roster.flyboys_day('Pátek')
             if friday_flyboys.empty:
                 await interaction.response.send_message("No flyboys shifts found for Friday.")
                 return
@@ -208,7 +212,7 @@ class DiscordHandler:
 
         @self.client.tree.command(name="flyboys-today", description="Show flyboys shifts for today")
         async def flyboys_today(interaction: discord.Interaction):
-            if self.flyboys.empty:
+            if self.roster.flyboys.empty:
                 await interaction.response.send_message("No flyboys data. Please run /scrape first.")
                 return
 
@@ -222,265 +226,291 @@ class DiscordHandler:
                 await interaction.response.send_message("Could not determine today's day.")
                 return
 
-            day_flyboys = self.flyboys[self.flyboys['day'] == czech_day]
+            day_flyboys = self.roster.flyboys_day(czech_day)
             if day_flyboys.empty:
                 await interaction.response.send_message(f"No flyboys shifts for today.")
                 return
 
-            await interaction.response.send_message(embed=self._create_flyboys_embed(day_flyboys, czech_day))
+            await interaction.response.send_message(embed=self._create_flyboys_embed(czech_day))
 
         @self.client.tree.command(name="flyboys-week", description="Show flyboys shifts for the whole week")
         async def flyboys_week(interaction: discord.Interaction):
-            if self.flyboys.empty:
+            if self.roster.flyboys.empty:
                 await interaction.response.send_message("No flyboys data. Please run /scrape first.")
                 return
 
-            days = [d for d in config.DAY_ORDER if d in self.flyboys['day'].values]
-
-            first_day = days[0]
-            first_shifts = self.flyboys[self.flyboys['day'] == first_day]
-            embed = self._create_flyboys_embed(first_shifts, first_day)
-            embed.set_footer(text=f"{first_day}  •  1 / {len(days)}")
-
-            await interaction.response.send_message(embed=embed)
-            message = await interaction.original_response()
-            await message.add_reaction("⬅️")
-            await message.add_reaction("➡️")
+            days = self.roster.flyboy_days
+            if not days:
+                await interaction.response.send_message("No flyboys shifts found for this week.")
+                return
 
-            self.paginated_messages[message.id] = {
+            await self._send_paginated(interaction, {
                 "mode": "flyboys_days",
                 "days": days,
                 "index": 0,
-                "flyboys_shifts": self.flyboys,
-            }
-
-    def _create_embed(self, today_shifts, location_name, day):
-        def format_group(df_group):
-            if df_group.empty:
-                return "-"
-            return "\n".join(f"{row['name']} ({row['time']})" for _, row in df_group.iterrows())
-        dop_barista = today_shifts[today_shifts['position_priority'] == 1]
-        dop_prisluha = today_shifts[today_shifts['position_priority'] == 2]
-        odp_barista  = today_shifts[today_shifts['position_priority'] == 3]
-        odp_prisluha = today_shifts[today_shifts['position_priority'] == 4]
-
-        embed = discord.Embed(title=f"{location_name} — {day}", color=0x88cc00)
-        embed.add_field(name="☀️ **Dopoledne — Barista**", value=format_group(dop_barista), inline=True)
-        embed.add_field(name="\u200b", value="\u200b", inline=True) 
-        embed.add_field(name="**Příluha**", value=format_group(dop_prisluha), inline=True)
-        embed.add_field(name="🌙 **Odpoledne — Barista**", value=format_group(odp_barista), inline=True)
-        embed.add_field(name="\u200b", value="\u200b", inline=True)
-        embed.add_field(name="**Příluha**", value=format_group(odp_prisluha), inline=True)
-        embed.add_field(name="\u200b", value="\u200b", inline=True)
+            })
+
+    async def _send_paginated(self, interaction, state):
+        """Answer a command with the first page and the page buttons"""
+        response = await interaction.response.send_message(
+            embed=self._page_embed(state), view=self.pagination_view
+        )
+        # The callback response carries the message id, no need to fetch the message
+        self.paginated_messages.set(response.message_id, state)
+
+    async def _turn_page(self, interaction, step):
+        """Move a paginated message by step pages, answered with a single response edit"""
+        state = self.paginated_messages.get(interaction.message.id)
+        if state is None:
+            await interaction.response.send_message(
+                "This list has expired, please run the command again.", ephemeral=True
+            )
+            return
+
+        items = state["trucks"] if state["mode"] == "trucks" else state["days"]
+        state["index"] = (state["index"] + step) % len(items)
+        # Storing it again restarts the TTL, so lists in use do not expire
+        self.paginated_messages.set(interaction.message.id, state)
+        await interaction.response.edit_message(embed=self._page_embed(state))
+
+    def _page_embed(self, state):
+        """Build the embed of the current page of a paginated message"""
+        mode = state["mode"]
+        items = state["trucks"] if mode == "trucks" else state["days"]
+        index = state["index"]
+        item = items[index]
+
+        if mode == "trucks":
+            embed = self._create_embed(item, state["czech_day"])
+        elif mode == "days":
+            embed = self._create_embed(state["truck"], item)
+        else:  # flyboys_days
+            embed = self._create_flyboys_embed(item)
+        footer = [item, f"{index + 1} / {len(items)}", self._updated_note()]
+        embed.set_footer(text="  •  ".join(part for part in footer if part))
         return embed
 
-    def _create_flyboys_embed(self, day_flyboys, day):
-        embed = discord.Embed(title=f"Flyboys — {day}", color=0xcc4400)
-        shift_types = day_flyboys['shift_type'].unique()
-        for shift_type in shift_types:
-            type_group = day_flyboys[day_flyboys['shift_type'] == shift_type]
-            positions = type_group['position'].unique()
-            for position in positions:
-                pos_group = type_group[type_group['position'] == position]
-                lines = [f"{row['name']} ({row['time']})" for _, row in pos_group.iterrows()]
-                embed.add_field(
-                    name=f"{shift_type} — {position}",
-                    value="\n".join(lines) if lines else "-",
-                    inline=True
-                )
+    def _updated_note(self):
+        """Describe when the current roster was scraped, None if it is not known"""
+        scraped_at = self.roster.scraped_at
+        return f"Updated {scraped_at:%d.%m. %H:%M}" if scraped_at else None
+
+    def _roster_embed(self, payload):
+        """Build a roster embed from a rendered payload, noting when it was scraped"""
+        embed = discord.Embed.from_dict(payload)
+        note = self._updated_note()
+        if note:
+            embed.set_footer(text=note)
         return embed
 
-    def _do_scrape(self):
-        """Login once and scrape both pages. Returns (shifts_df, flyboys_df) or (None, None) on login failure."""
-        session = requests.Session()
-        response = session.post("https://is.kofikofi.cz/", data=self.payload)
-        if not (response.status_code == 200 and "Burza" in response.text):
-            session.close()
-            return None, None
-
-        shifts_df = self._scrape_shifts_page(session)
-        flyboys_df = self._scrape_flyboys_page(session)
-        session.close()
-        return shifts_df, flyboys_df
-
-    def _scrape_shifts_page(self, session):
-        response = session.get("https://is.kofikofi.cz/index.php?what=read2&truck=0")
-        if response.status_code != 200:
-            return pd.DataFrame()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = []
-        for table in soup.find_all("table", class_="smeny_tab"):
-            headline = table.find("th", class_="headline")
-            if not headline:
-                continue
-            truck_name = headline.get_text(strip=True)
-            for row in table.find_all("tr"):
-                day_th = row.find("th")
-                if not day_th:
-                    continue
-                day = day_th.get_text(strip=True)
-                if day == "":
-                    continue
-                for td in row.find_all("td"):
-                    cell_id = td.get("id")
-                    if not cell_id:
-                        continue
-                    parts = cell_id.split("|")
-                    if len(parts) != 3:
-                        continue
-                    position = parts[2]
-                    for div in td.find_all("div", class_="neni_me"):
-                        a = div.find("a")
-                        if not a:
-                            continue
-                        name = a.get_text(strip=True)
-                        text = div.get_text(" ", strip=True)
-                        time_match = re.search(r"\((.*?)\)", text)
-                        time = time_match.group(1) if time_match else None
-                        results.append({
-                            "truck": truck_name,
-                            "day": day,
-                            "position": position,
-                            "name": name,
-                            "time": time
-                        })
-        if not results:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(results)
-        df['day_categorical'] = pd.Categorical(df['day'], categories=config.DAY_ORDER, ordered=True)
-        df['truck_categorical'] = pd.Categorical(df['truck'], categories=config.TRUCK_ORDER, ordered=True)
-        df['position_priority'] = df['position'].apply(self._get_position_priority)
-        df['start_time_minutes'] = df['time'].apply(self._get_start_time)
-        return df.sort_values(
-            ['day_categorical', 'truck_categorical', 'position_priority', 'start_time_minutes']
-        ).reset_index(drop=True)
-
-    def _scrape_flyboys_page(self, session):
-        response = session.get("https://is.kofikofi.cz/index.php?what=read2_fb")
-        if response.status_code != 200:
-            return pd.DataFrame()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        results = []
-        for table in soup.find_all("table", class_="smeny_tab"):
-            headline = table.find("th", class_="headline")
-            if not headline:
-                continue
-            shift_type = headline.get_text(strip=True)
-            current_headers = []
-
-            for row in table.find_all("tr"):
-                ths = row.find_all("th")
-                tds = row.find_all("td")
-
-                # Header row: first th is empty, the rest are position descriptions
-                if len(ths) > 1 and ths[0].get_text(strip=True) == "":
-                    current_headers = [th.get_text(strip=True) for th in ths[1:]]
-                    continue
-
-                # Data row: single th with the day name
-                if len(ths) == 1 and tds:
-                    day = ths[0].get_text(strip=True)
-                    if not day:
-                        continue
-                    for i, td in enumerate(tds):
-                        for div in td.find_all("div", class_="neni_me"):
-                            a = div.find("a")
-                            if not a:
-                                continue
-                            name = a.get_text(strip=True)
-                            text = div.get_text(" ", strip=True)
-                            time_match = re.search(r"\((.*?)\)", text)
-                            time = time_match.group(1) if time_match else None
-                            position = current_headers[i] if i < len(current_headers) else "Unknown"
-                            results.append({
-                                "shift_type": shift_type,
-                                "day": day,
-                                "position": position,
-                                "name": name,
-                                "time": time,
-                            })
-        if not results:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(results)
-        df['day_categorical'] = pd.Categorical(df['day'], categories=config.DAY_ORDER, ordered=True)
-        return df.sort_values(['day_categorical', 'shift_type']).reset_index(drop=True)
-    
-    # Helper function to assign position priority
-    def _get_position_priority(self, position):
-        """Assign priority to positions for sorting"""
-        pos_lower = position.lower()
-        
-        if 'barista' in pos_lower and ('dopoledne' in pos_lower or 'vikend' in pos_lower and 'odpoledne' not in pos_lower and 'sanitace' not in pos_lower):
-            return 1
-        elif 'prisluha' in pos_lower and ('dopoledne' in pos_lower or 'vikend' in pos_lower and 'odpoledne' not in pos_lower):
-            return 2
-        elif 'barista' in pos_lower:
-            return 3
-        elif 'prisluha' in pos_lower:
-            return 4
-        else:
-            return 5
-
-    # Helper function to extract start time
-    def _get_start_time(self, time_str):
-        """Extract start time from time string for sorting"""
-        try:
-            start = time_str.split('-')[0].strip()
-            hours, minutes = start.split(':')
-            return int(hours) * 60 + int(minutes)  # Convert to minutes for easy comparison
-        except:
-            return 9999  # Put invalid times at the end
+    def _create_embed(self, location_name, day):
+        """Build the shifts embed of a truck and day from the render cache"""
+        key = ('shifts', location_name, day)
+        payload = self.roster.embeds.get(key)
+        if payload is None:
+            payload = self._render_shifts(self.roster.truck_day(location_name, day), location_name, day)
+            self.roster.embeds[key] = payload
+        return self._roster_embed(payload)
+
+    def _create_flyboys_embed(self, day):
+        """Build the flyboys embed of a day from the render cache"""
+        key = ('flyboys', None, day)
+        payload = self.roster.embeds.get(key)
+        if payload is None:
+            payload = self._render_flyboys(self.roster.flyboys_day(day), day)
+            self.roster.embeds[key] = payload
+        return self._roster_embed(payload)
+
+    def _render_embeds(self, roster):
+        """Pre-render the embed payloads of a freshly scraped roster"""
+        for (truck, day), shifts in roster.by_truck_day.items():
+            roster.embeds[('shifts', truck, day)] = self._render_shifts(shifts, truck, day)
+        for day, flyboys in roster.flyboys_by_day.items():
+            roster.embeds[('flyboys', None, day)] = self._render_flyboys(flyboys, day)
+
+    def _render_shifts(self, today_shifts, location_name, day):
+        """Render the embed payload for the shifts of a truck on a day"""
+        def field(name, value):
+            return {"name": name, "value": value, "inline": True}
+        # An empty roster has no columns to group by
+        groups = {} if today_shifts.empty else today_shifts.groupby('position_priority')['label'].agg("\n".join)
+        dop_barista = groups.get(1, "-")
+        dop_prisluha = groups.get(2, "-")
+        odp_barista = groups.get(3, "-")
+        odp_prisluha = groups.get(4, "-")
+
+        return {
+            "type": "rich",
+            "title": f"{location_name} — {day}",
+            "color": 0x88cc00,
+            "fields": [
+                field("☀️ **Dopoledne — Barista**", dop_barista),
+                field("\u200b", "\u200b"),
+                field("**Příluha**", dop_prisluha),
+                field("🌙 **Odpoledne — Barista**", odp_barista),
+                field("\u200b", "\u200b"),
+                field("**Příluha**", odp_prisluha),
+                field("\u200b", "\u200b"),
+            ],
+        }
 
-    async def on_raw_reaction_add(self, payload):
-        if payload.user_id == self.client.user.id:
+    def _render_flyboys(self, day_flyboys, day):
+        """Render the embed payload for the flyboys shifts of a day"""
+        fields = []
+        if day_flyboys.empty:
+            return {"type": "rich", "title": f"Flyboys — {day}", "color": 0xcc4400, "fields": fields}
+        groups = day_flyboys.groupby(['shift_type', 'position'], observed=True, sort=False)['label'].agg("\n".join)
+        # Shift types in order of appearance, positions in order of appearance within a type
+        type_order = {shift_type: i for i, shift_type in enumerate(day_flyboys['shift_type'].unique())}
+        for (shift_type, position), lines in sorted(groups.items(), key=lambda item: type_order[item[0][0]]):
+            fields.append({
+                "name": f"{shift_type} — {position}",
+                "value": lines or "-",
+                "inline": True,
+            })
+        return {"type": "rich", "title": f"Flyboys — {day}", "color": 0xcc4400, "fields": fields}
+
+    async def _do_scrape(self):
+        """Fetch both IS pages and build the roster. Returns an indexed ShiftStore or None on login failure."""
+        pages = await self.is_client.fetch_pages()
+        if pages is None:
+            return None
+
+        # Most scrapes return the same roster, keep the current snapshot and its caches
+        fingerprint = tuple(page_fingerprint(page) for page in pages)
+        if fingerprint == self.roster.fingerprint:
+            return self.roster
+
+        # Parsing and indexing is CPU bound, keep it off the event loop
+        roster = await asyncio.to_thread(self._build_roster, *pages)
+        roster.fingerprint = fingerprint
+        return roster
+
+    def _build_roster(self, shifts_page, flyboys_page):
+        """Parse the fetched pages into a ShiftStore with pre-rendered embeds"""
+        from roster import ShiftStore, shifts_frame, flyboys_frame
+        from scraper import parse_shifts, parse_flyboys
+
+        shifts_df = shifts_frame(parse_shifts(shifts_page) if shifts_page is not None else [])
+        flyboys_df = flyboys_frame(parse_flyboys(flyboys_page) if flyboys_page is not None else [])
+        roster = ShiftStore(shifts_df, flyboys_df)
+        self._render_embeds(roster)
+        return roster
+
+    @property
+    def roster(self):
+        """Current ShiftStore snapshot, the last saved one until the first scrape finishes"""
+        if self._roster is None:
+            self._roster = self._load_roster()
+        return self._roster
+
+    @roster.setter
+    def roster(self, roster):
+        self._roster = roster
+
+    def _load_roster(self):
+        # The roster subsystem (pandas) is imported on first use, so the
+        # Telegram side does not wait for it at startup
+        from roster import ShiftStore
+        return ShiftStore.load() or ShiftStore()
+
+    async def _set_roster(self, roster):
+        """Swap in a freshly scraped roster snapshot and announce what changed"""
+        roster.scraped_at = self.scrapes.last_scrape_at
+        if roster is self.roster:
+            print("Scrape completed, roster unchanged.")
+            # Saved again for the new scrape time
+            await self._save_roster(roster)
             return
+        previous = self.roster
+        self.roster = roster
+        print(f"Scrape completed. Got {len(roster.shifts)} shift records and {len(roster.flyboys)} flyboys records.")
+        await self._save_roster(roster)
+
+        # Nothing to compare against on the first scrape
+        if previous.shifts.empty or roster.shifts.empty:
+            return
+        from roster import diff_shifts
+        changes = await asyncio.to_thread(diff_shifts, previous.shifts, roster.shifts)
+        if any(changes.values()):
+            await self._post_roster_changes(changes)
+
+    async def _save_roster(self, roster):
+        """Persist a roster snapshot without blocking the event loop"""
+        try:
+            # Copied on the loop, commands keep rendering embeds into the roster meanwhile
+            await asyncio.to_thread(roster.snapshot().save)
+        except OSError as e:
+            print(f"Could not save roster snapshot: {e}")
+
+    async def _post_roster_changes(self, changes):
+        """
+        Post a summary of roster changes to the shifts channel
         
-        emoji = str(payload.emoji)
+        Args:
+            changes: Result of roster.diff_shifts
+        """
+        def describe(key):
+            truck, day, position, name = key
+            return f"{truck} — {day} — {position}: {name}"
+
+        lines = [f"➕ {describe(key)} ({time})" for key, time in changes['added']]
+        lines += [f"➖ {describe(key)} ({time})" for key, time in changes['removed']]
+        lines += [f"🔄 {describe(key)} ({old} → {new})" for key, old, new in changes['changed']]
+        if len(lines) > config.ROSTER_DIFF_MAX_LINES:
+            hidden = len(lines) - config.ROSTER_DIFF_MAX_LINES
+            lines = lines[:config.ROSTER_DIFF_MAX_LINES] + [f"… and {hidden} more"]
+
+        channel = self.client.get_channel(config.SMENY_CHANNEL_ID)
+        if channel is None:
+            try:
+                channel = await self.client.fetch_channel(config.SMENY_CHANNEL_ID)
+            except (discord.NotFound, discord.Forbidden) as e:
+                print(f"Shifts channel {config.SMENY_CHANNEL_ID} not found: {e}")
+                return
 
-        if emoji in ("⬅️", "➡️"):
-            if payload.message_id not in self.paginated_messages:
+        # One message, split only when it exceeds Discord's 2000 character limit
+        messages = []
+        message = "**Roster changes**"
+        for line in lines:
+            if len(message) + len(line) + 1 > 2000:
+                messages.append(message)
+                message = ""
+            message = f"{message}\n{line}" if message else line
+        messages.append(message)
+
+        for message in messages:
+            try:
+                await self.delivery.deliver(
+                    ('messages', channel.id),
+                    lambda message=message: channel.send(message),
+                    priority=PRIORITY_ANNOUNCEMENT,
+                )
+            except DeliveryFailed as e:
+                # The roster itself is already updated, only the announcement is lost
+                print(f"Could not post roster changes: {e}")
                 return
-            state = self.paginated_messages[payload.message_id]
-            mode = state["mode"]
-            items = state["trucks"] if mode == "trucks" else state["days"]
-            index = state["index"]
 
-            if emoji == "➡️":
-                index = (index + 1) % len(items)
-            else:
-                index = (index - 1) % len(items)
-            state["index"] = index
-
-            if mode == "trucks":
-                truck = items[index]
-                shifts = state["day_shifts"][state["day_shifts"]["truck"] == truck]
-                embed = self._create_embed(shifts, truck, state["czech_day"])
-                embed.set_footer(text=f"{truck}  •  {index + 1} / {len(items)}")
-            elif mode == "days":
-                day = items[index]
-                shifts = state["truck_shifts"][state["truck_shifts"]["day"] == day]
-                embed = self._create_embed(shifts, state["truck"], day)
-                embed.set_footer(text=f"{day}  •  {index + 1} / {len(items)}")
-            else:  # flyboys_days
-                day = items[index]
-                day_flyboys = state["flyboys_shifts"][state["flyboys_shifts"]["day"] == day]
-                embed = self._create_flyboys_embed(day_flyboys, day)
-                embed.set_footer(text=f"{day}  •  {index + 1} / {len(items)}")
-
-            channel = self.client.get_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            await message.edit(embed=embed)
-
-            # Remove the user's reaction so they can navigate again
-            user = await self.client.fetch_user(payload.user_id)
-            await message.remove_reaction(payload.emoji, user)
+    def cache_stats(self):
+        """Return size and hit/miss/eviction counters of the pagination state"""
+        return {
+            'pagination': self.paginated_messages.stats(),
+        }
+
+    async def close(self):
+        """Stop background scrapes and release the IS HTTP session"""
+        self.scrapes.stop()
+        await self.is_client.close()
+    
+    async def on_raw_reaction_add(self, payload):
+        if payload.user_id == self.client.user.id:
+            return
         
-        else: # ✅
-            await self._approve_message(payload, payload.channel_id)
+        # Page buttons replaced the arrow reactions, leftovers from older messages are ignored
+        if str(payload.emoji) in ("⬅️", "➡️"):
+            return
+        
+        await self._approve_message(payload, payload.channel_id)
 
     async def _approve_message(self, payload, approval_channel_id):
         """
@@ -497,27 +527,212 @@ class DiscordHandler:
             print("Main channel not found! Please configure MAIN_CHANNEL_ID.")
             return
         
-        # Get the message
-        message = await approval_channel.fetch_message(payload.message_id)
-        
-        # Check if message has an embed (our approval message)
-        if not message.embeds:
-            return
+        async with self._approval_lock(payload.message_id):
+            # Get the message
+            message = await approval_channel.fetch_message(payload.message_id)
+
+            # Check if message has an embed (our approval message); batched
+            # messages are approved per embed with their buttons instead
+            if len(message.embeds) != 1:
+                return
+            if self._already_approved(message):
+                return
+
+            await self._approve(message, payload.user_id)
+
+    def _approval_lock(self, message_id):
+        """Get the lock serializing the approvals of one approval message"""
+        lock = self.approval_locks.get(message_id)
+        if lock is None:
+            lock = self.approval_locks[message_id] = asyncio.Lock()
+        return lock
+
+    async def _approve(self, message, approver_id):
+        """
+        Post a single-embed approval message to the main channel and mark it approved
         
+        Args:
+            message: Discord approval message
+            approver_id: ID of the user who approved
+        """
         # Get the original embed
         original_embed = message.embeds[0]
         
+        # Send to main channel with attachments
+        await self._publish(message, None, approver_id, await self._get_approval_files(message))
+        
+        if self.ledger is not None:
+            self.ledger.set_status(message.id, 'approved')
+
+        # Update the approval message
+        await self._mark_as_approved(message, original_embed, approver_id)
+
+    async def on_embed_approval(self, interaction, index):
+        """
+        Approve one embed of a batched approval message and post it to the main channel
+        
+        Args:
+            interaction: Button interaction on the approval message
+            index: Index of the approved embed
+        """
+        message = interaction.message
+        if index >= len(message.embeds) or self._already_approved(message, index):
+            await interaction.response.send_message("This message was already approved.", ephemeral=True)
+            return
+
+        if not self.client.get_channel(config.MAIN_CHANNEL_ID):
+            print("Main channel not found! Please configure MAIN_CHANNEL_ID.")
+            await interaction.response.send_message("Main channel not found.", ephemeral=True)
+            return
+
+        # Posting can wait on rate limits (and on other approvals), acknowledge the click first
+        await interaction.response.defer()
+        async with self._approval_lock(message.id):
+            # The interaction carries the message as it was when the button was
+            # clicked, approvals of other embeds may have edited it since
+            message = await message.channel.fetch_message(message.id)
+            if index >= len(message.embeds) or self._already_approved(message, index):
+                await interaction.followup.send("This message was already approved.", ephemeral=True)
+                return
+            embeds, view = await self._approve_embed(message, index, interaction.user)
+            await interaction.edit_original_response(embeds=embeds, view=view)
+
+    async def _approve_embed(self, message, index, approver):
+        """
+        Post one embed of a batched approval message to the main channel
+        
+        Args:
+            message: Discord approval message
+            index: Index of the approved embed
+            approver: User who approved
+            
+        Returns:
+            tuple: (embeds, view) to update the approval message with
+        """
+        embeds = message.embeds
+        await self._publish(message, index, approver.id)
+
+        if self.ledger is not None:
+            self.ledger.set_status(message.id, 'approved', index)
+
+        embeds[index].set_footer(
+            text=f"✅ Approved by {approver.display_name} and posted to main channel"
+        )
+        # Approvals whose message edit has not gone through are only in the ledger
+        for i, embed in enumerate(embeds):
+            if not self._is_approved(embed) and self._already_approved(message, i):
+                embed.set_footer(text="✅ Approved and posted to main channel")
+        pending = [i for i, embed in enumerate(embeds) if not self._is_approved(embed)]
+        return embeds, approval_view(pending) if pending else None
+
+    @staticmethod
+    def _is_approved(embed):
+        return bool(embed.footer and embed.footer.text and embed.footer.text.startswith("✅ Approved"))
+
+    def _already_approved(self, message, embed_index=None):
+        """
+        Check the approval footer and the ledger
+        
+        The delivery keys only deduplicate approvals that are still pending,
+        the ledger also knows approvals whose message edit never went through.
+        """
+        if self._is_approved(message.embeds[embed_index or 0]):
+            return True
+        return self.ledger is not None and self.ledger.is_approved(message.id, embed_index)
+
+    async def _publish(self, message, embed_index, approver_id, files=()):
+        """
+        Post an approved embed to the main channel through the delivery scheduler
+        
+        If the post keeps failing it is stored as a dead letter, which
+        /replay-failed approves again.
+        
+        Args:
+            message: Discord approval message
+            embed_index: Index of the approved embed, None for a single-embed message
+            approver_id: ID of the user who approved
+            files: discord.File attachments to post along
+            
+        Returns:
+            discord.Message: Message posted to the main channel
+        """
+        main_channel = self.client.get_channel(config.MAIN_CHANNEL_ID)
         # Create a new embed for the main channel (without the approval footer)
-        approved_embed = self._create_approved_embed(original_embed)
+        approved_embed = self._create_approved_embed(message.embeds[embed_index or 0])
+
+        async def send():
+            for file in files:
+                file.reset()  # Rewind what a failed attempt already read
+            return await main_channel.send(embed=approved_embed, files=list(files))
+
+        key = f"approval:{message.id}" if embed_index is None else f"approval:{message.id}:{embed_index}"
+        return await self.delivery.deliver(
+            ('messages', main_channel.id),
+            send,
+            key=key,
+            priority=PRIORITY_APPROVAL,
+            dead_letter=('approval', {
+                'channel_id': message.channel.id,
+                'message_id': message.id,
+                'embed_index': embed_index,
+                'approver_id': approver_id,
+            }),
+        )
+
+    async def replay_approval(self, payload):
+        """
+        Approve the message of a dead letter again
         
-        # Send to main channel with attachments
-        await main_channel.send(
-            embed=approved_embed,
-            files=[await attachment.to_file() for attachment in message.attachments]
+        Args:
+            payload: {'channel_id', 'message_id', 'embed_index', 'approver_id'}
+        """
+        channel = self.client.get_channel(payload['channel_id'])
+        if channel is None:
+            channel = await self.client.fetch_channel(payload['channel_id'])
+        index = payload['embed_index']
+
+        async with self._approval_lock(payload['message_id']):
+            message = await channel.fetch_message(payload['message_id'])
+            if index is None:
+                if message.embeds and not self._already_approved(message):
+                    await self._approve(message, payload['approver_id'])
+                return
+
+            if index < len(message.embeds) and not self._already_approved(message, index):
+                approver = await self.client.fetch_user(payload['approver_id'])
+                embeds, view = await self._approve_embed(message, index, approver)
+                await self._deliver_edit(message, embeds=embeds, view=view)
+
+    async def _deliver_edit(self, message, **kwargs):
+        """Edit an approval message through the delivery scheduler"""
+        await self.delivery.deliver(
+            ('messages', message.channel.id),
+            lambda: message.edit(**kwargs),
+            priority=PRIORITY_APPROVAL,
         )
+
+    async def _get_approval_files(self, message):
+        """
+        Get the attachments of an approval message as Discord files
         
-        # Update the approval message
-        await self._mark_as_approved(message, original_embed, payload.user_id)
+        Uses the media cached at forwarding time and only downloads the
+        attachments if the entry was evicted (or the bot was restarted).
+        
+        Args:
+            message: Discord approval message
+            
+        Returns:
+            list[discord.File]: Files to post to the main channel
+        """
+        if not message.attachments:
+            return []
+
+        if self.media_cache is not None:
+            payload = self.media_cache.pop(message.id)
+            if payload and len(payload) == len(message.attachments):
+                return files_from_payload(payload)
+
+        return [await attachment.to_file() for attachment in message.attachments]
 
     def _create_approved_embed(self, original_embed):
         """
@@ -575,22 +790,51 @@ class DiscordHandler:
         original_embed.set_footer(
             text=f"✅ Approved by {approver.display_name} and posted to main channel"
         )
-        await message.edit(embed=original_embed)
+        await self._deliver_edit(message, embed=original_embed)
         
         # Remove all reactions to prevent double-approval
-        await message.clear_reactions()
+        await self.delivery.deliver(
+            ('reactions', message.channel.id),
+            message.clear_reactions,
+            priority=PRIORITY_APPROVAL,
+        )
 
     async def on_ready(self):
         """Called when the Discord bot is ready"""
         print(f'Logged in as {self.client.user}')
         print('Discord bot is ready!')
-        shifts, flyboys = await asyncio.to_thread(self._do_scrape)
-        if shifts is not None:
-            self.shifts = shifts
-            self.flyboys = flyboys
-            print(f"Initial scrape completed. Got {len(shifts)} shift records and {len(flyboys)} flyboys records.")
-        else:
-            print("Initial scrape failed or returned no data.")
+        if self._roster is None:
+            # Import pandas and load the saved snapshot without blocking the event loop
+            self._roster = await asyncio.to_thread(self._load_roster)
+        # Scrapes immediately the first time, reconnects do not trigger another scrape
+        self.scrapes.start()
+
+
+class PaginationView(discord.ui.View):
+    """
+    Previous/next buttons of the paginated shift messages
+
+    The buttons have fixed custom ids and no timeout, so a single instance
+    serves every paginated message, also after a restart.
+    """
+
+    def __init__(self, turn_page):
+        """
+        Initialize the view
+
+        Args:
+            turn_page: Coroutine function called with (interaction, step), step being -1 or 1
+        """
+        super().__init__(timeout=None)
+        self.turn_page = turn_page
+
+    @discord.ui.button(emoji="⬅️", style=discord.ButtonStyle.secondary, custom_id="pagination:previous")
+    async def previous_page(self, interaction, button):
+        await self.turn_page(interaction, -1)
+
+    @discord.ui.button(emoji="➡️", style=discord.ButtonStyle.secondary, custom_id="pagination:next")
+    async def next_page(self, interaction, button):
+        await self.turn_page(interaction, 1)
 
 
 class MyClient(discord.Client):
@@ -606,6 +850,35 @@ class MyClient(discord.Client):
     
     async def setup_hook(self):
         """Setup hook called when the client is ready"""
-        # Sync commands with Discord
+        # Sync commands with Discord, but only if they changed since the last sync
+        tree_hash = self._command_tree_hash()
+        if not config.FORCE_COMMAND_SYNC and tree_hash == self._stored_command_tree_hash():
+            print("Commands unchanged, skipping sync.")
+            return
+
         await self.tree.sync()
-        print("Commands synced!")
\ No newline at end of file
+        self._store_command_tree_hash(tree_hash)
+        print("Commands synced!")
+
+    def _command_tree_hash(self):
+        """Hash the global command definitions (names, descriptions, options, choices)"""
+        commands = sorted(
+            (command.to_dict(self.tree) for command in self.tree.get_commands()),
+            key=lambda command: (command.get('type', 1), command['name'])
+        )
+        serialized = json.dumps(commands, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def _stored_command_tree_hash(self):
+        try:
+            with open(config.COMMAND_TREE_HASH_PATH, encoding='utf-8') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _store_command_tree_hash(self, tree_hash):
+        try:
+            with open(config.COMMAND_TREE_HASH_PATH, 'w', encoding='utf-8') as f:
+                f.write(tree_hash)
+        except OSError as e:
+            print(f"Could not store command tree hash: {e}")
\ No newline at end of file
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import sqlite3
+import time
+import config
+
+
+class ForwardLedger:
+    """
+    Persistent record of forwarded Telegram messages
+
+    Maps (chat_id, message_id) -> approval message id (and the index of its
+    embed in a batched approval message) -> approval status.
+    Writes are buffered and committed in batches; the database runs in WAL
+    mode so reads never wait for a commit.
+
+    Deliveries that failed for good are kept in the dead_letters table
+    until they are replayed.
+    """
+
+    def __init__(self, path=config.LEDGER_PATH,
+                 flush_interval=config.LEDGER_FLUSH_SECONDS,
+                 batch_size=config.LEDGER_BATCH_SIZE):
+        """
+        Initialize the ledger
+
+        Args:
+            path: SQLite database file
+            flush_interval: Seconds between batched commits
+            batch_size: Number of pending writes that forces an early commit
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS forwards (
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                grouped_id INTEGER,
+                approval_message_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                forwarded_at REAL NOT NULL,
+                embed_index INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chat_id, message_id)
+            );
+            CREATE INDEX IF NOT EXISTS forwards_approval
+                ON forwards (approval_message_id);
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                error TEXT,
+                failed_at REAL NOT NULL
+            );
+        """)
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(forwards)")}
+        if 'embed_index' not in columns:
+            # Databases created before batched approval messages existed
+            self.connection.execute("ALTER TABLE forwards ADD COLUMN embed_index INTEGER NOT NULL DEFAULT 0")
+        self.connection.commit()
+        self.pending_forwards = {}  # (chat_id, message_id) -> row
+        self.pending_approvals = []  # (status, approval_message_id, embed_index, embed_index)
+        self.claimed = set()  # (chat_id, message_id) currently being forwarded
+        self.flush_task = None
+
+    def start(self):
+        """Start the periodic flush (must be called from a running event loop)"""
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def is_forwarded(self, chat_id, message_id):
+        """Check whether a message was already forwarded"""
+        if (chat_id, message_id) in self.pending_forwards:
+            return True
+        row = self.connection.execute(
+            "SELECT 1 FROM forwards WHERE chat_id = ? AND message_id = ?",
+            (chat_id, message_id)
+        ).fetchone()
+        return row is not None
+
+    def claim(self, chat_id, message_id):
+        """
+        Reserve a message for forwarding
+
+        Returns:
+            bool: False if the message was already forwarded or is in flight
+        """
+        key = (chat_id, message_id)
+        if key in self.claimed or self.is_forwarded(chat_id, message_id):
+            return False
+        self.claimed.add(key)
+        return True
+
+    def release(self, chat_id, message_id):
+        """Drop a claim, e.g. after the forward failed"""
+        self.claimed.discard((chat_id, message_id))
+
+    def record_forward(self, chat_id, message_ids, grouped_id, approval_message_id, embed_index=0):
+        """
+        Record forwarded messages and the approval message they were posted as
+
+        Args:
+            chat_id: Telegram chat ID
+            message_ids: Telegram message IDs (all parts for an album)
+            grouped_id: Telegram album ID or None
+            approval_message_id: Discord approval message ID
+            embed_index: Index of the message's embed in the approval message
+        """
+        now = time.time()
+        for message_id in message_ids:
+            key = (chat_id, message_id)
+            self.pending_forwards[key] = (
+                chat_id, message_id, grouped_id, approval_message_id, 'pending', now, embed_index
+            )
+            self.claimed.discard(key)
+        self._maybe_flush()
+
+    def set_status(self, approval_message_id, status, embed_index=None):
+        """
+        Update the approval status of messages posted as approval_message_id
+
+        Args:
+            approval_message_id: Discord approval message ID
+            status: New status, e.g. 'approved'
+            embed_index: Only update the message of this embed, None for all of them
+        """
+        self.pending_approvals.append((status, approval_message_id, embed_index, embed_index))
+        self._maybe_flush()
+
+    def is_approved(self, approval_message_id, embed_index=None):
+        """
+        Check whether an approval message (or one of its embeds) was approved
+
+        Args:
+            approval_message_id: Discord approval message ID
+            embed_index: Index of the embed, None for a single-embed message
+        """
+        for status, message_id, index, _ in self.pending_approvals:
+            if (status == 'approved' and message_id == approval_message_id
+                    and (index is None or embed_index is None or index == embed_index)):
+                return True
+        row = self.connection.execute(
+            "SELECT 1 FROM forwards WHERE approval_message_id = ? AND status = 'approved'"
+            " AND (? IS NULL OR embed_index = ?) LIMIT 1",
+            (approval_message_id, embed_index, embed_index)
+        ).fetchone()
+        return row is not None
+
+    def seen_range(self, chat_id):
+        """
+        Return the oldest and newest forwarded message IDs of a chat
+
+        Returns:
+            tuple: (first, last) or None if nothing from this chat was forwarded yet
+        """
+        self.flush()
+        row = self.connection.execute(
+            "SELECT MIN(message_id), MAX(message_id) FROM forwards WHERE chat_id = ?",
+            (chat_id,)
+        ).fetchone()
+        return None if row[0] is None else row
+
+    def add_dead_letter(self, key, kind, payload, error=None):
+        """
+        Store a delivery that failed for good, replacing an older one with the same key
+
+        Args:
+            key: Idempotency key of the delivery
+            kind: What to replay, e.g. 'forward' or 'approval'
+            payload: JSON serializable replay arguments
+            error: Description of the last error
+        """
+        # Rare and must survive a crash, so committed right away
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO dead_letters VALUES (?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(payload), error, time.time())
+            )
+
+    def dead_letters(self):
+        """
+        Return the stored dead letters, oldest first
+
+        Returns:
+            list[tuple]: (key, kind, payload, error)
+        """
+        rows = self.connection.execute(
+            "SELECT key, kind, payload, error FROM dead_letters ORDER BY failed_at"
+        ).fetchall()
+        return [(key, kind, json.loads(payload), error) for key, kind, payload, error in rows]
+
+    def has_dead_letter(self, key):
+        row = self.connection.execute("SELECT 1 FROM dead_letters WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def remove_dead_letter(self, key):
+        """Delete a dead letter, e.g. before replaying it"""
+        with self.connection:
+            self.connection.execute("DELETE FROM dead_letters WHERE key = ?", (key,))
+
+    def _maybe_flush(self):
+        if len(self.pending_forwards) + len(self.pending_approvals) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Commit all buffered writes in one transaction"""
+        if not self.pending_forwards and not self.pending_approvals:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO forwards (chat_id, message_id, grouped_id, approval_message_id,"
+                " status, forwarded_at, embed_index) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self.pending_forwards.values()
+            )
+            self.connection.executemany(
+                "UPDATE forwards SET status = ? WHERE approval_message_id = ?"
+                " AND (? IS NULL OR embed_index = ?)",
+                self.pending_approvals
+            )
+        self.pending_forwards = {}
+        self.pending_approvals = []
+
+    def close(self):
+        """Flush outstanding writes and close the database"""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.flush()
+        self.connection.close()
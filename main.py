@@ -1,13 +1,51 @@
 """
 Telegram to Discord Bridge Bot
 Main entry point - initializes and runs both Telegram and Discord clients
+
+Run with --profile-startup to print import times and time-to-first-event.
 """
+import sys
+
+# Installed before the imports below so they are timed too
+startup_profile = None
+if "--profile-startup" in sys.argv:
+    from startup_profile import StartupProfile
+    startup_profile = StartupProfile()
+    startup_profile.install()
+
 from telethon import TelegramClient
 from telethon.sessions import StringSession
 import asyncio
 import config
 from telegram_handler import TelegramHandler
 from discord_handler import MyClient, DiscordHandler
+from media import create_media_cache
+from ledger import ForwardLedger
+from delivery import DeliveryScheduler
+
+if startup_profile is not None:
+    startup_profile.mark("imports done")
+
+
+async def catch_up_when_ready(discord_client, telegram_handler):
+    """Forward messages missed while offline once Discord is ready, and again after every reconnect"""
+    await discord_client.wait_until_ready()
+    while True:
+        await telegram_handler.catch_up()
+        # A resumed session or a new one after a longer outage
+        reconnects = [asyncio.create_task(discord_client.wait_for(event)) for event in ('resumed', 'ready')]
+        try:
+            await asyncio.wait(reconnects, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in reconnects:
+                task.cancel()
+
+
+async def log_stats(sources, interval=config.STATS_LOG_SECONDS):
+    """Print the counters of every stats source (name -> function) periodically"""
+    while True:
+        await asyncio.sleep(interval)
+        print("Stats: " + "; ".join(f"{name} {stats()}" for name, stats in sources.items()))
 
 
 async def main():
@@ -24,18 +62,55 @@ async def main():
     # Initialize Discord client
     discord_client = MyClient()
     
-    # Initialize handlers
-    telegram_handler = TelegramHandler(telegram_client, discord_client)
-    discord_handler = DiscordHandler(discord_client)
+    # Initialize handlers, sharing the forwarded media with the approval flow
+    media_cache = create_media_cache()
+    ledger = ForwardLedger()
+    ledger.start()
+    delivery = DeliveryScheduler(ledger)
+    telegram_handler = TelegramHandler(telegram_client, discord_client, media_cache, ledger, delivery)
+    discord_handler = DiscordHandler(discord_client, media_cache, ledger, delivery)
+    profile_task = None
+    stats_sources = {
+        'telegram': telegram_handler.cache_stats,
+        'media': media_cache.stats,
+        'discord': discord_handler.cache_stats,
+        'delivery': delivery.stats,
+    }
+    stats_task = asyncio.create_task(log_stats(stats_sources)) if config.STATS_LOG_SECONDS else None
+    if startup_profile is not None:
+        from startup_profile import watch_first_events
+        startup_profile.mark("handlers created")
+        profile_task = asyncio.create_task(watch_first_events(startup_profile, telegram_client, discord_client))
     
     # Start Telegram client
     await telegram_client.start()
     print("Telegram client started!")
+    if startup_profile is not None:
+        startup_profile.mark("telegram connected")
     
     # Start Discord client
     print("Starting Discord client...")
-    async with discord_client:
-        await discord_client.start(config.DISCORD_TOKEN)
+    try:
+        async with discord_client:
+            catch_up_task = asyncio.create_task(catch_up_when_ready(discord_client, telegram_handler))
+            try:
+                await discord_client.start(config.DISCORD_TOKEN)
+            finally:
+                # No new catch-up forwards while the queued ones are drained
+                catch_up_task.cancel()
+                await asyncio.gather(catch_up_task, return_exceptions=True)
+                # Forwards in progress still need the Discord connection
+                await telegram_handler.close()
+    finally:
+        if stats_task is not None:
+            stats_task.cancel()
+        if profile_task is not None:
+            # Still waiting for a first event if the bot stops early
+            profile_task.cancel()
+            await asyncio.gather(profile_task, return_exceptions=True)
+        await discord_handler.close()
+        delivery.close()
+        ledger.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+import asyncio
+import io
+import tempfile
+import discord
+import config
+from cache import LRUCache
+
+
+def media_filename(message):
+    """
+    Build the attachment filename for a Telegram message's media
+
+    Args:
+        message: Telethon message with media
+
+    Returns:
+        str: Filename usable as a Discord attachment name
+    """
+    filename = message.file.name or f"message_{message.id}{message.file.ext or ''}"
+    # Discord hides attachments whose names start with a dot
+    if filename.startswith("."):
+        filename = f"prefix{filename}"
+    return filename
+
+
+def upload_limit(channel):
+    """Return the maximum upload size in bytes of a Discord channel"""
+    guild = getattr(channel, 'guild', None)
+    return guild.filesize_limit if guild is not None else config.DISCORD_UPLOAD_LIMIT_BYTES
+
+
+def thumbnail_size(message):
+    """
+    Return the size of the largest Telegram-provided thumbnail of a document
+
+    Returns:
+        int or None if the document has no thumbnail
+    """
+    thumbs = getattr(message.document, 'thumbs', None)
+    if not thumbs:
+        return None
+    # Sized thumbs report their size, stripped ones carry their bytes inline
+    return max(getattr(thumb, 'size', None) or len(getattr(thumb, 'bytes', b'')) for thumb in thumbs)
+
+
+def preflight(message, limit, shrink_target=None):
+    """
+    Decide how a message's media is posted, without downloading anything
+
+    Args:
+        message: Telethon message with media
+        limit: Upload limit in bytes
+        shrink_target: Size oversized images are recompressed to, None if
+            images cannot be recompressed
+
+    Returns:
+        tuple: (how, size) where how is 'file' for the full media, 'shrink'
+        for an image that is recompressed to fit, 'thumb' for a preview of
+        an image or video that is too large, or 'link' if only a link to
+        the Telegram message can be posted
+    """
+    size = message.file.size
+    if size is None or size <= limit:
+        return 'file', size or 0
+
+    mime_type = message.file.mime_type or ''
+    if (shrink_target is not None and mime_type in config.RECOMPRESS_MIME_TYPES
+            and size <= config.RECOMPRESS_MAX_INPUT_BYTES):
+        return 'shrink', min(shrink_target, limit)
+    thumb = thumbnail_size(message)
+    if thumb is not None and thumb <= limit and mime_type.startswith(('image/', 'video/')):
+        return 'thumb', thumb
+    return 'link', size
+
+
+def plan_media(messages, limit, max_files=config.DISCORD_MAX_ATTACHMENTS, shrink_target=None):
+    """
+    Split the media of messages into posts that Discord accepts
+
+    Every post holds at most max_files attachments of at most limit bytes
+    in total; media that does not fit at all is left for a link.
+
+    Args:
+        messages: Telethon messages in posting order
+        limit: Upload limit in bytes per post
+        max_files: Maximum attachments per post
+        shrink_target: Size oversized images are recompressed to, None to never recompress
+
+    Returns:
+        tuple: (posts, skipped) where posts is a list of lists of
+        (message, how) and skipped the messages that only get a link
+    """
+    posts = []
+    skipped = []
+    used = 0
+    for message in messages:
+        if not message.file:
+            continue
+        how, size = preflight(message, limit, shrink_target)
+        if how == 'link':
+            skipped.append(message)
+            continue
+        if not posts or len(posts[-1]) >= max_files or used + size > limit:
+            posts.append([])
+            used = 0
+        posts[-1].append((message, how))
+        used += size
+    return posts, skipped
+
+
+def message_link(message):
+    """
+    Build a t.me link to a Telegram message
+
+    Returns:
+        str or None for chats that have no message links (private chats)
+    """
+    username = getattr(message.chat, 'username', None)
+    if username:
+        return f"https://t.me/{username}/{message.id}"
+    chat_id = str(message.chat_id)
+    if chat_id.startswith('-100'):
+        return f"https://t.me/c/{chat_id[4:]}/{message.id}"
+    return None
+
+
+def describe_skipped(messages, previews=()):
+    """
+    Format a field value listing media that was too large to upload
+
+    Args:
+        messages: Messages whose media was not uploaded
+        previews: Messages whose media was only uploaded as a preview image
+
+    Returns:
+        str: One line per message, linking to it on Telegram where possible
+    """
+    lines = []
+    for message, note in [(m, "") for m in messages] + [(m, ", preview attached") for m in previews]:
+        name = media_filename(message)
+        size = f"{(message.file.size or 0) / (1024 * 1024):.1f} MB{note}"
+        link = message_link(message)
+        lines.append(f"[{name}]({link}) ({size})" if link else f"{name} ({size})")
+    value = "\n".join(lines)
+    return value if len(value) <= 1024 else value[:1021] + "..."
+
+
+async def download_media_file(message, thumbnail=False):
+    """
+    Download a message's media into memory and wrap it as a Discord file
+
+    The media is written to a SpooledTemporaryFile, which only spills to
+    disk once it grows past config.MEDIA_SPOOL_MAX_BYTES. Large documents
+    are fetched with download_parallel, falling back to Telethon's
+    sequential download if that fails.
+
+    Args:
+        message: Telethon message with media
+        thumbnail: Download the largest Telegram-provided thumbnail instead of the media
+
+    Returns:
+        discord.File or None if the message has no downloadable media
+    """
+    if not message.file:
+        return None
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=config.MEDIA_SPOOL_MAX_BYTES)
+    try:
+        size = message.file.size or 0
+        if thumbnail:
+            await message.download_media(file=buffer, thumb=-1)
+        elif message.document is not None and size >= config.MEDIA_PARALLEL_MIN_BYTES:
+            try:
+                await download_parallel(message.client, message.document, buffer, size)
+            except Exception as e:
+                print(f"Parallel download of message {message.id} failed ({e!r}), downloading sequentially")
+                buffer.seek(0)
+                buffer.truncate()
+                await message.download_media(file=buffer)
+        else:
+            await message.download_media(file=buffer)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    filename = media_filename(message)
+    if thumbnail:
+        filename = f"{filename.rsplit('.', 1)[0]}_preview.jpg"
+    return discord.File(buffer, filename=filename)
+
+
+async def download_parallel(client, document, out, size,
+                            workers=config.MEDIA_DOWNLOAD_WORKERS,
+                            part_size=config.MEDIA_DOWNLOAD_PART_SIZE):
+    """
+    Download a document with several concurrent GetFile requests
+
+    The file is split into one contiguous range of parts per worker. Every
+    worker streams its range with client.iter_download and writes the parts
+    at their offsets into out, which is preallocated to the full size.
+
+    Args:
+        client: Telethon client
+        document: Telethon Document to download
+        out: Seekable binary file to write to
+        size: Size of the document in bytes
+        workers: Number of concurrent requests
+        part_size: Bytes per request, a multiple of 4 KiB that divides 1 MiB
+    """
+    parts = -(-size // part_size)
+    parts_per_worker = -(-parts // workers)
+
+    # Preallocate, so every worker can write at its own offset. A spooled buffer
+    # is moved to disk first and extended there, instead of holding the whole
+    # file as zeros in memory until it rolls over
+    if size > config.MEDIA_SPOOL_MAX_BYTES and hasattr(out, 'rollover'):
+        out.rollover()
+        out.truncate(size)
+    else:
+        out.seek(size - 1)
+        out.write(b"\0")
+
+    async def download_range(first_part, part_count):
+        position = first_part * part_size
+        async for chunk in client.iter_download(
+            document,
+            offset=position,
+            limit=part_count,
+            request_size=part_size,
+            file_size=size,
+        ):
+            out.seek(position)
+            out.write(chunk)
+            position += len(chunk)
+        return position - first_part * part_size
+
+    tasks = [
+        asyncio.create_task(download_range(first_part, min(parts_per_worker, parts - first_part)))
+        for first_part in range(0, parts, parts_per_worker)
+    ]
+    try:
+        received = await asyncio.gather(*tasks)
+    except BaseException:
+        # Stop the other ranges before anyone reuses out
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    if sum(received) != size:
+        raise IOError(f"Downloaded {sum(received)} of {size} bytes")
+    out.seek(0)
+
+
+def create_media_cache():
+    """
+    Create the cache of forwarded media, keyed by approval message id
+
+    Entries are lists of (filename, bytes) and are evicted least recently
+    used first once config.MEDIA_CACHE_MAX_BYTES is exceeded. Callers only
+    store posts up to config.MEDIA_CACHE_MAX_ENTRY_BYTES.
+    """
+    return LRUCache(
+        config.MEDIA_CACHE_MAX_ENTRIES,
+        max_weight=config.MEDIA_CACHE_MAX_BYTES,
+        weigh=lambda files: sum(len(data) for _, data in files),
+    )
+
+
+def read_file_payload(file):
+    """
+    Read the contents of a discord.File without consuming it
+
+    Args:
+        file: discord.File backed by a seekable buffer
+
+    Returns:
+        tuple: (filename, bytes)
+    """
+    data = file.fp.read()
+    file.reset()
+    return file.filename, data
+
+
+def files_from_payload(payload):
+    """Build fresh discord.File objects from cached (filename, bytes) pairs"""
+    return [discord.File(io.BytesIO(data), filename=filename) for filename, data in payload]
@@ -0,0 +1,121 @@
+import asyncio
+from collections import deque
+import config
+
+
+class ForwardPipeline:
+    """
+    Bounded worker pool for forwarding jobs
+
+    Jobs are sharded by key (the source chat id) onto a fixed set of workers,
+    so jobs of one chat run in submission order while different chats are
+    processed in parallel.
+    """
+
+    POLICIES = ('block', 'drop', 'spill')
+
+    def __init__(self, workers=config.FORWARD_WORKERS,
+                 queue_size=config.FORWARD_QUEUE_SIZE,
+                 policy=config.FORWARD_BACKPRESSURE):
+        """
+        Initialize the pipeline
+
+        Args:
+            workers: Number of concurrent workers
+            queue_size: Maximum number of queued jobs per worker
+            policy: What to do when a worker queue is full:
+                'block' waits for space, 'drop' discards the job,
+                'spill' keeps it in an unbounded in-memory overflow
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy!r}, expected one of {self.POLICIES}")
+        self.workers = workers
+        self.queue_size = queue_size
+        self.policy = policy
+        self.queues = []
+        self.overflows = []
+        self.tasks = []
+        self.dropped = 0
+        self.closed = False
+
+    def start(self):
+        """Start the worker tasks (must be called from a running event loop)"""
+        if self.tasks:
+            return
+        for index in range(self.workers):
+            self.queues.append(asyncio.Queue(maxsize=self.queue_size))
+            self.overflows.append(deque())
+            self.tasks.append(asyncio.create_task(self._worker(index)))
+
+    async def submit(self, key, func, *args):
+        """
+        Queue a job
+
+        Args:
+            key: Ordering key, jobs with the same key never run concurrently
+            func: Coroutine function to run
+            *args: Arguments for func
+
+        Returns:
+            bool: False if the job was dropped
+        """
+        if self.closed:
+            return False
+        self.start()
+        index = hash(key) % self.workers
+        queue = self.queues[index]
+        overflow = self.overflows[index]
+        job = (func, args)
+
+        if self.policy == 'block':
+            await queue.put(job)
+        elif self.policy == 'drop':
+            try:
+                queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                print(f"Forward queue {index} full, dropping job for {key}")
+                return False
+        else:
+            # Once something spilled, keep appending to the overflow to preserve order
+            if overflow or queue.full():
+                overflow.append(job)
+            else:
+                queue.put_nowait(job)
+        return True
+
+    async def _worker(self, index):
+        queue = self.queues[index]
+        overflow = self.overflows[index]
+        while True:
+            func, args = await queue.get()
+            try:
+                await func(*args)
+            except Exception as e:
+                print(f"Forwarding job failed: {e!r}")
+            finally:
+                # Refilled before task_done, so join() never sees an empty queue while jobs spilled
+                while overflow and not queue.full():
+                    queue.put_nowait(overflow.popleft())
+                queue.task_done()
+
+    async def close(self, timeout=0):
+        """
+        Stop accepting jobs and cancel all workers
+
+        Args:
+            timeout: Seconds the queued jobs get to finish before the workers are cancelled
+        """
+        self.closed = True
+        if timeout and self.tasks:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+            except asyncio.TimeoutError:
+                print(f"Forward queues not empty after {timeout}s, dropping the remaining jobs")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queues = []
+        self.overflows = []
+
@@ -0,0 +1,293 @@
+import copy
+import os
+import pickle
+from collections import Counter
+import numpy as np
+import pandas as pd
+import config
+
+
+# Bump when the ShiftStore layout changes, older snapshots are then ignored
+SNAPSHOT_VERSION = 2
+
+
+START_TIME_PATTERN = r'^\s*(\d+)\s*:\s*(\d+)\s*(?:-|$)'
+INVALID_START_TIME = 9999  # Sorts rows without a parsable time last
+
+
+def position_priority(positions):
+    """
+    Assign sort priorities to positions
+
+    1 morning barista, 2 morning helper, 3 other barista, 4 other helper,
+    5 anything else. Weekend positions count as morning unless they are
+    afternoon (or, for baristas, cleaning) shifts.
+
+    Args:
+        positions: Series of position strings
+
+    Returns:
+        Series of int priorities
+    """
+    # Rosters repeat a handful of positions, so classify each distinct value once
+    codes, uniques = pd.factorize(positions, use_na_sentinel=False)
+    pos = pd.Series(uniques).astype(str).str.lower()
+    barista = pos.str.contains('barista', regex=False)
+    prisluha = pos.str.contains('prisluha', regex=False)
+    dopoledne = pos.str.contains('dopoledne', regex=False)
+    odpoledne = pos.str.contains('odpoledne', regex=False)
+    vikend = pos.str.contains('vikend', regex=False)
+    sanitace = pos.str.contains('sanitace', regex=False)
+
+    priority = np.select(
+        [
+            barista & (dopoledne | (vikend & ~odpoledne & ~sanitace)),
+            prisluha & (dopoledne | (vikend & ~odpoledne)),
+            barista,
+            prisluha,
+        ],
+        [1, 2, 3, 4],
+        default=5,
+    )
+    return pd.Series(priority[codes], index=positions.index)
+
+
+def start_time_minutes(times):
+    """
+    Extract shift start times as minutes after midnight
+
+    Args:
+        times: Series of time strings like "7:30 - 14:00" (or None)
+
+    Returns:
+        Series of int minutes, INVALID_START_TIME where no time could be parsed
+    """
+    codes, uniques = pd.factorize(times, use_na_sentinel=False)
+    parts = pd.Series(uniques, dtype='string').str.extract(START_TIME_PATTERN)
+    minutes = (parts[0].astype(float) * 60 + parts[1].astype(float)).fillna(INVALID_START_TIME)
+    return pd.Series(minutes.to_numpy(dtype=int)[codes], index=times.index)
+
+
+def shifts_frame(records):
+    """
+    Build the sorted shifts DataFrame from parsed records
+
+    Sorted by day, truck, position priority and start time.
+    """
+    if not records:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(records)
+    df['day_categorical'] = pd.Categorical(df['day'], categories=config.DAY_ORDER, ordered=True)
+    df['truck_categorical'] = pd.Categorical(df['truck'], categories=config.TRUCK_ORDER, ordered=True)
+    df['position_priority'] = position_priority(df['position'])
+    df['start_time_minutes'] = start_time_minutes(df['time'])
+    return df.sort_values(
+        ['day_categorical', 'truck_categorical', 'position_priority', 'start_time_minutes']
+    ).reset_index(drop=True)
+
+
+def flyboys_frame(records):
+    """Build the flyboys DataFrame from parsed records, sorted by day and shift type"""
+    if not records:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(records)
+    df['day_categorical'] = pd.Categorical(df['day'], categories=config.DAY_ORDER, ordered=True)
+    return df.sort_values(['day_categorical', 'shift_type']).reset_index(drop=True)
+
+
+def shift_labels(df):
+    """Format rows as "name (time)" lines"""
+    return df['name'].astype(str) + " (" + df['time'].astype(str) + ")"
+
+
+class ShiftStore:
+    """
+    Snapshot of scraped shifts and flyboys with lookup indexes
+
+    The indexes are built once at ingest time, so slash commands and
+    pagination resolve their rows with dict lookups instead of scanning
+    the frames with boolean masks.
+    """
+
+    def __init__(self, shifts=None, flyboys=None):
+        """
+        Initialize the store
+
+        Args:
+            shifts: Sorted shifts DataFrame from the shifts page
+            flyboys: Sorted flyboys DataFrame from the flyboys page
+        """
+        self.shifts = self._compact(shifts, ['truck', 'day', 'name', 'position'])
+        self.flyboys = self._compact(flyboys, ['shift_type', 'day', 'name', 'position'])
+        for df in (self.shifts, self.flyboys):
+            if not df.empty:
+                df['label'] = shift_labels(df)
+        self.empty_frame = self.shifts.iloc[0:0]
+        self.empty_flyboys = self.flyboys.iloc[0:0]
+
+        self.by_truck_day = {}   # (truck, day) -> DataFrame
+        self.by_day = {}         # day -> DataFrame
+        self.by_truck = {}       # truck -> DataFrame
+        self.trucks_by_day = {}  # day -> [truck, ...] in roster order
+        self.days_by_truck = {}  # truck -> [day, ...] in DAY_ORDER
+        if not self.shifts.empty:
+            self.by_truck_day = self._group(self.shifts, ['truck', 'day'])
+            self.by_day = self._group(self.shifts, 'day')
+            self.by_truck = self._group(self.shifts, 'truck')
+            for truck, day in self.by_truck_day:
+                self.trucks_by_day.setdefault(day, []).append(truck)
+                if day in config.DAY_ORDER:
+                    self.days_by_truck.setdefault(truck, []).append(day)
+            for days in self.days_by_truck.values():
+                days.sort(key=config.DAY_ORDER.index)
+
+        self.flyboys_by_day = {}  # day -> DataFrame
+        self.flyboy_days = []     # [day, ...] in DAY_ORDER
+        if not self.flyboys.empty:
+            self.flyboys_by_day = self._group(self.flyboys, 'day')
+            self.flyboy_days = [d for d in config.DAY_ORDER if d in self.flyboys_by_day]
+
+        # Rendered embed payloads, (kind, truck, day) -> dict. Living on the
+        # snapshot means they are replaced together with the data they render.
+        self.embeds = {}
+
+        # Hashes of the pages this snapshot was parsed from
+        self.fingerprint = None
+        # datetime of the last scrape that returned these pages
+        self.scraped_at = None
+
+    def snapshot(self):
+        """
+        Copy the store for saving it from another thread
+
+        Embeds are still rendered into the live store on the event loop
+        while the copy is pickled, so the copy gets its own embeds dict.
+        """
+        snapshot = copy.copy(self)
+        snapshot.embeds = dict(self.embeds)
+        return snapshot
+
+    def save(self, path=config.SNAPSHOT_PATH):
+        """
+        Persist the snapshot, including indexes and rendered embeds
+
+        The file is written next to the target and swapped in atomically.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': SNAPSHOT_VERSION, 'store': self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=config.SNAPSHOT_PATH):
+        """
+        Load the last saved snapshot
+
+        Returns:
+            ShiftStore or None if there is no usable snapshot
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Could not load roster snapshot {path}: {e!r}")
+            return None
+
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+            print(f"Ignoring roster snapshot {path} with an outdated format")
+            return None
+        return data['store']
+
+    @staticmethod
+    def _compact(df, columns):
+        """Store repetitive string columns as categoricals"""
+        if df is None or df.empty:
+            return pd.DataFrame()
+        df = df.copy()
+        for column in columns:
+            if column in df:
+                df[column] = df[column].astype('category')
+        return df
+
+    @staticmethod
+    def _group(df, keys):
+        """Split df into a dict of key -> rows, keeping the roster order"""
+        return {key: group for key, group in df.groupby(keys, observed=True, sort=False)}
+
+    def truck_day(self, truck, day):
+        """Shifts of one truck on one day"""
+        return self.by_truck_day.get((truck, day), self.empty_frame)
+
+    def day(self, day):
+        """Shifts of all trucks on one day"""
+        return self.by_day.get(day, self.empty_frame)
+
+    def truck(self, truck):
+        """Shifts of one truck for the whole week"""
+        return self.by_truck.get(truck, self.empty_frame)
+
+    def day_trucks(self, day):
+        """Trucks with shifts on a day, in roster order"""
+        return self.trucks_by_day.get(day, [])
+
+    def truck_days(self, truck):
+        """Days on which a truck has shifts, in week order"""
+        return self.days_by_truck.get(truck, [])
+
+    def flyboys_day(self, day):
+        """Flyboys shifts of one day"""
+        return self.flyboys_by_day.get(day, self.empty_flyboys)
+
+
+def _shift_map(df):
+    """Map (truck, day, position, name) -> sorted list of times"""
+    shifts = {}
+    if df.empty:
+        return shifts
+    columns = [df[column].astype(str).tolist() for column in ('truck', 'day', 'position', 'name')]
+    for truck, day, position, name, time in zip(*columns, df['time'].tolist()):
+        # NaN never equals itself, missing times are compared as None
+        shifts.setdefault((truck, day, position, name), []).append(None if pd.isna(time) else time)
+    for times in shifts.values():
+        times.sort(key=str)
+    return shifts
+
+
+def diff_shifts(old, new):
+    """
+    Compare two shifts frames
+
+    Shifts are matched by (truck, day, position, name) in a dict, so the
+    diff runs in linear time. Times present in both frames are unchanged,
+    only the remaining ones are paired up as changes.
+
+    Args:
+        old: Previous shifts DataFrame
+        new: Current shifts DataFrame
+
+    Returns:
+        dict: 'added' and 'removed' lists of (key, time), 'changed' list of
+        (key, old_time, new_time)
+    """
+    old_map = _shift_map(old)
+    new_map = _shift_map(new)
+    added, removed, changed = [], [], []
+
+    for key, new_times in new_map.items():
+        old_counts, new_counts = Counter(old_map.get(key, [])), Counter(new_times)
+        unchanged = old_counts & new_counts
+        old_times = sorted((old_counts - unchanged).elements(), key=str)
+        new_times = sorted((new_counts - unchanged).elements(), key=str)
+        changed.extend((key, old_time, new_time) for old_time, new_time in zip(old_times, new_times))
+        added.extend((key, time) for time in new_times[len(old_times):])
+        removed.extend((key, time) for time in old_times[len(new_times):])
+
+    for key, old_times in old_map.items():
+        if key not in new_map:
+            removed.extend((key, time) for time in old_times)
+
+    return {'added': added, 'removed': removed, 'changed': changed}
@@ -0,0 +1,423 @@
+"""
+Client and parsers for the IS shift pages
+
+Both pages are parsed into plain record dicts. The lxml backend is used
+when lxml is installed; the BeautifulSoup backend is the fallback and
+produces the same records.
+"""
+import asyncio
+import hashlib
+import random
+import re
+from datetime import datetime
+import importlib.util
+import aiohttp
+import config
+
+# The HTML parsers are imported by the backends on first use
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+
+TIME_PATTERN = re.compile(r"\((.*?)\)")
+
+IS_URL = "https://is.kofikofi.cz/"
+SHIFTS_URL = "https://is.kofikofi.cz/index.php?what=read2&truck=0"
+FLYBOYS_URL = "https://is.kofikofi.cz/index.php?what=read2_fb"
+LOGGED_IN_MARKER = b"Burza"  # Only shown to logged in users
+
+
+def page_fingerprint(page):
+    """Return a short hash of a page body, None for a missing page"""
+    if page is None:
+        return None
+    return hashlib.blake2b(page, digest_size=16).digest()
+
+
+class ISClient:
+    """Keeps one logged-in, keep-alive HTTP session to IS across scrapes"""
+
+    def __init__(self, login, password, timeout=config.SCRAPER_TIMEOUT_SECONDS):
+        """
+        Initialize the client
+
+        Args:
+            login: IS login
+            password: IS password
+            timeout: Total timeout of a single request in seconds
+        """
+        self.payload = {
+            'login': str(login),
+            'heslo': str(password),
+            'ok': 'Přihlásit se'
+        }
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        self.logged_in = False
+        self.login_lock = asyncio.Lock()
+        self.validators = {}  # url -> (etag, last_modified, body)
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+            self.logged_in = False
+        return self.session
+
+    async def login(self):
+        """
+        Log in to IS
+
+        Returns:
+            bool: Whether the login succeeded
+        """
+        async with self._get_session().post(IS_URL, data=self.payload) as response:
+            body = await response.read()
+            self.logged_in = response.status == 200 and LOGGED_IN_MARKER in body
+        return self.logged_in
+
+    async def _get(self, url):
+        """
+        Return (status, body) of a GET request
+
+        Sends the validators of the last response, so an unchanged page can
+        be answered with 304 and served from the cached body.
+        """
+        headers = {}
+        cached = self.validators.get(url)
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        async with self._get_session().get(url, headers=headers) as response:
+            if response.status == 304 and cached:
+                return 200, cached[2]
+            body = await response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if response.status == 200 and (etag or last_modified):
+                self.validators[url] = (etag, last_modified, body)
+            else:
+                self.validators.pop(url, None)
+            return response.status, body
+
+    async def _ensure_logged_in(self, stale=False):
+        """Log in unless a session exists, or again if it turned out stale"""
+        async with self.login_lock:
+            if stale or not self.logged_in:
+                return await self.login()
+            return True
+
+    async def fetch_pages(self):
+        """
+        Fetch the shifts and flyboys pages concurrently
+
+        Logs in only if there is no session yet or the pages show the
+        session expired.
+
+        Returns:
+            tuple: (shifts_html, flyboys_html) as bytes, None for a page that
+            could not be fetched, or None if the login failed
+        """
+        if not await self._ensure_logged_in():
+            return None
+
+        for attempt in range(2):
+            results = await asyncio.gather(self._get(SHIFTS_URL), self._get(FLYBOYS_URL))
+            expired = any(status == 200 and LOGGED_IN_MARKER not in body for status, body in results)
+            if not expired:
+                break
+            if attempt or not await self._ensure_logged_in(stale=True):
+                return None
+
+        return tuple(body if status == 200 else None for status, body in results)
+
+    async def close(self):
+        """Close the HTTP session"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self.logged_in = False
+
+
+class ScrapeCoordinator:
+    """
+    Runs scrapes one at a time and refreshes periodically
+
+    Callers arriving while a scrape is running await that same scrape
+    instead of starting another one.
+    """
+
+    def __init__(self, scrape, on_result,
+                 interval=config.SCRAPE_INTERVAL_SECONDS,
+                 jitter=config.SCRAPE_JITTER_SECONDS):
+        """
+        Initialize the coordinator
+
+        Args:
+            scrape: Coroutine function performing one scrape, returning a result or None on failure
+            on_result: Coroutine function awaited with every successful (not None) result
+            interval: Seconds between background refreshes, 0 to disable them
+            jitter: Maximum random deviation from interval in seconds
+        """
+        self.scrape = scrape
+        self.on_result = on_result
+        self.interval = interval
+        self.jitter = jitter
+        self.in_flight = None
+        self.refresh_task = None
+        self.last_scrape_at = None  # datetime of the last successful scrape
+
+    async def refresh(self):
+        """
+        Scrape now, or join the scrape that is already running
+
+        Returns:
+            The scrape result, None on failure
+        """
+        if self.in_flight is None:
+            self.in_flight = asyncio.create_task(self._run())
+            self.in_flight.add_done_callback(self._on_done)
+        # Shield so a cancelled caller does not cancel the scrape for everyone
+        return await asyncio.shield(self.in_flight)
+
+    async def _run(self):
+        result = await self.scrape()
+        if result is not None:
+            self.last_scrape_at = datetime.now()
+            await self.on_result(result)
+        return result
+
+    def _on_done(self, task):
+        self.in_flight = None
+        if not task.cancelled() and task.exception():
+            # Retrieved here so a scrape nobody awaits anymore does not warn
+            print(f"Scrape failed: {task.exception()!r}")
+
+    def start(self):
+        """Start the background refresh loop (idempotent)"""
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if await self.refresh() is None:
+                    print("Scheduled scrape failed or returned no data.")
+            except Exception:
+                pass  # Already logged in _on_done
+
+            if self.last_scrape_at is None:
+                # No snapshot yet, retry soon
+                delay = config.SCRAPE_RETRY_SECONDS
+            elif self.interval:
+                delay = self.interval + random.uniform(-self.jitter, self.jitter)
+            else:
+                return
+            await asyncio.sleep(max(delay, 0))
+
+    def stop(self):
+        """Stop the background refresh loop"""
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            self.refresh_task = None
+
+
+class Bs4Backend:
+    """Element access on top of BeautifulSoup, only parsing the shift tables"""
+
+    name = "bs4"
+
+    def tables(self, page):
+        from bs4 import BeautifulSoup, SoupStrainer
+
+        # Only build the tables, the class is checked afterwards because the
+        # strainer does not match multi-valued class attributes reliably
+        soup = BeautifulSoup(page, "html.parser", parse_only=SoupStrainer("table"))
+        return soup.find_all("table", class_="smeny_tab")
+
+    def find_all(self, element, tag, class_=None):
+        if class_ is None:
+            return element.find_all(tag)
+        return element.find_all(tag, class_=class_)
+
+    def find(self, element, tag, class_=None):
+        if class_ is None:
+            return element.find(tag)
+        return element.find(tag, class_=class_)
+
+    def text(self, element, separator=""):
+        return element.get_text(separator, strip=True)
+
+    def attr(self, element, name):
+        return element.get(name)
+
+
+class LxmlBackend:
+    """Element access on top of lxml, roughly an order of magnitude faster than bs4"""
+
+    name = "lxml"
+
+    def tables(self, page):
+        from bs4.dammit import UnicodeDammit
+        from lxml import html as lxml_html
+        from lxml.etree import ParserError
+
+        if isinstance(page, bytes):
+            # Detect the encoding the same way BeautifulSoup does
+            page = UnicodeDammit(page, is_html=True).unicode_markup
+        try:
+            root = lxml_html.fromstring(page)
+        except ParserError:
+            return []
+        return [table for table in root.iter("table") if self._has_class(table, "smeny_tab")]
+
+    @staticmethod
+    def _has_class(element, class_):
+        return class_ in (element.get("class") or "").split()
+
+    def find_all(self, element, tag, class_=None):
+        return [
+            child for child in element.iterdescendants(tag)
+            if class_ is None or self._has_class(child, class_)
+        ]
+
+    def find(self, element, tag, class_=None):
+        for child in element.iterdescendants(tag):
+            if class_ is None or self._has_class(child, class_):
+                return child
+        return None
+
+    def text(self, element, separator=""):
+        return separator.join(s.strip() for s in element.itertext() if s.strip())
+
+    def attr(self, element, name):
+        return element.get(name)
+
+
+def get_backend(name=None):
+    """
+    Return the parser backend
+
+    Args:
+        name: "lxml", "bs4" or "auto" (default: config.SCRAPER_PARSER)
+    """
+    name = name or config.SCRAPER_PARSER
+    if name == "auto":
+        name = "lxml" if HAS_LXML else "bs4"
+    if name == "lxml":
+        if not HAS_LXML:
+            raise ImportError("lxml is not installed, use the 'bs4' scraper backend")
+        return LxmlBackend()
+    if name == "bs4":
+        return Bs4Backend()
+    raise ValueError(f"Unknown scraper backend {name!r}")
+
+
+def _parse_shift_div(backend, div):
+    """Return (name, time) of a shift div, or None if it has no name link"""
+    a = backend.find(div, "a")
+    if a is None:
+        return None
+    name = backend.text(a)
+    time_match = TIME_PATTERN.search(backend.text(div, " "))
+    time = time_match.group(1) if time_match else None
+    return name, time
+
+
+def parse_shifts(page, backend=None):
+    """
+    Parse the trucks shifts page
+
+    Args:
+        page: HTML as str or bytes
+        backend: Parser backend name, see get_backend
+
+    Returns:
+        list[dict]: Records with truck, day, position, name and time
+    """
+    backend = get_backend(backend)
+    results = []
+    for table in backend.tables(page):
+        headline = backend.find(table, "th", class_="headline")
+        if headline is None:
+            continue
+        truck_name = backend.text(headline)
+        for row in backend.find_all(table, "tr"):
+            day_th = backend.find(row, "th")
+            if day_th is None:
+                continue
+            day = backend.text(day_th)
+            if day == "":
+                continue
+            for td in backend.find_all(row, "td"):
+                cell_id = backend.attr(td, "id")
+                if not cell_id:
+                    continue
+                parts = cell_id.split("|")
+                if len(parts) != 3:
+                    continue
+                position = parts[2]
+                for div in backend.find_all(td, "div", class_="neni_me"):
+                    shift = _parse_shift_div(backend, div)
+                    if shift is None:
+                        continue
+                    results.append({
+                        "truck": truck_name,
+                        "day": day,
+                        "position": position,
+                        "name": shift[0],
+                        "time": shift[1]
+                    })
+    return results
+
+
+def parse_flyboys(page, backend=None):
+    """
+    Parse the flyboys shifts page
+
+    Args:
+        page: HTML as str or bytes
+        backend: Parser backend name, see get_backend
+
+    Returns:
+        list[dict]: Records with shift_type, day, position, name and time
+    """
+    backend = get_backend(backend)
+    results = []
+    for table in backend.tables(page):
+        headline = backend.find(table, "th", class_="headline")
+        if headline is None:
+            continue
+        shift_type = backend.text(headline)
+        current_headers = []
+
+        for row in backend.find_all(table, "tr"):
+            ths = backend.find_all(row, "th")
+            tds = backend.find_all(row, "td")
+
+            # Header row: first th is empty, the rest are position descriptions
+            if len(ths) > 1 and backend.text(ths[0]) == "":
+                current_headers = [backend.text(th) for th in ths[1:]]
+                continue
+
+            # Data row: single th with the day name
+            if len(ths) == 1 and tds:
+                day = backend.text(ths[0])
+                if not day:
+                    continue
+                for i, td in enumerate(tds):
+                    for div in backend.find_all(td, "div", class_="neni_me"):
+                        shift = _parse_shift_div(backend, div)
+                        if shift is None:
+                            continue
+                        position = current_headers[i] if i < len(current_headers) else "Unknown"
+                        results.append({
+                            "shift_type": shift_type,
+                            "day": day,
+                            "position": position,
+                            "name": shift[0],
+                            "time": shift[1],
+                        })
+    return results
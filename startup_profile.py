@@ -0,0 +1,118 @@
+"""
+Startup profiling for `python main.py --profile-startup`
+
+Times every module import and how long each client takes until its first
+event, then prints one report.
+"""
+import asyncio
+import sys
+import time
+import importlib.abc
+
+
+class StartupProfile(importlib.abc.MetaPathFinder):
+    """Import timer and startup milestone recorder"""
+
+    def __init__(self, top=25):
+        """
+        Initialize the profile
+
+        Args:
+            top: Number of slowest imports listed in the report
+        """
+        self.top = top
+        self.started_at = time.perf_counter()
+        self.imports = []  # (module, self seconds, cumulative seconds)
+        self.stack = []  # Seconds spent in nested imports, per running import
+        self.marks = {}  # milestone -> seconds since started_at
+        self.reported = False
+
+    def install(self):
+        """Time all imports from now on"""
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        # Resolve with the regular finders and only wrap the loader
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # Builtin and frozen importers are classes shared by all their modules
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            loader.exec_module = self._timed(name, loader.exec_module)
+        return spec
+
+    def _timed(self, name, exec_module):
+        def timed_exec_module(module):
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self.stack.pop()
+                if self.stack:
+                    self.stack[-1] += elapsed
+                self.imports.append((name, elapsed - nested, elapsed))
+        return timed_exec_module
+
+    def mark(self, milestone):
+        """Record the first time a milestone is reached"""
+        self.marks.setdefault(milestone, time.perf_counter() - self.started_at)
+
+    def report(self):
+        """Print the slowest imports and the milestones"""
+        self.reported = True
+        self.uninstall()
+        total = sum(own for _, own, _ in self.imports)
+        print(f"Startup profile: {len(self.imports)} modules imported in {total * 1000:.0f} ms")
+        print(f"{'self ms':>9} {'cumulative ms':>14}  module")
+        for name, own, cumulative in sorted(self.imports, key=lambda i: i[2], reverse=True)[:self.top]:
+            print(f"{own * 1000:9.1f} {cumulative * 1000:14.1f}  {name}")
+        print("Milestones (ms since start):")
+        for milestone, at in sorted(self.marks.items(), key=lambda m: m[1]):
+            print(f"{at * 1000:9.0f}  {milestone}")
+
+
+async def watch_first_events(profile, telegram_client, discord_client, timeout=60):
+    """
+    Mark the first event of both clients and print the report once both arrived
+
+    Meant to run as a task alongside the clients, started before they connect.
+
+    Args:
+        profile: Installed StartupProfile
+        telegram_client: Telethon client (before it connects)
+        discord_client: Discord client (before it starts)
+        timeout: Seconds after Discord is ready to report without a Telegram update
+    """
+    from telethon import events
+
+    def check_done():
+        if not profile.reported and {"telegram first update", "discord ready"} <= profile.marks.keys():
+            profile.report()
+
+    async def on_first_update(event):
+        profile.mark("telegram first update")
+        telegram_client.remove_event_handler(on_first_update)
+        check_done()
+
+    telegram_client.add_event_handler(on_first_update, events.Raw)
+
+    await discord_client.wait_until_ready()
+    profile.mark("discord ready")
+    check_done()
+    # A quiet account may not get a Telegram update for a while
+    await asyncio.sleep(timeout)
+    if not profile.reported:
+        profile.report()
@@ -1,26 +1,67 @@
 from telethon import events
 import discord
-import os
-from os import listdir
-from os.path import isfile, join
+import asyncio
+import io
 from datetime import timezone, timedelta
+from collections import namedtuple
 import config
-import shutil
+from album import AlbumAssembler
+from approval import approval_view, batch_footer
+from batch import EmbedBatcher
+from delivery import DeliveryScheduler, DeliveryFailed, PRIORITY_REACTION
+from media import download_media_file, read_file_payload, plan_media, upload_limit, describe_skipped, thumbnail_size
+from pipeline import ForwardPipeline
+from cache import LRUCache
+from transform import ImageRecompressor, HAS_PILLOW
+
+
+# Resolved routing entry for a monitored chat
+ChatRoute = namedtuple('ChatRoute', ['approval_channel_id', 'color', 'filter_topic', 'topic_id'])
+
+
+class MessageEvent:
+    """Minimal stand-in for a NewMessage event wrapping an already fetched message"""
+
+    def __init__(self, message):
+        self.message = message
+        self.chat_id = message.chat_id
+        self.sender_id = message.sender_id
+
+    async def get_sender(self):
+        return await self.message.get_sender()
+
+    async def get_chat(self):
+        return await self.message.get_chat()
 
 
 class TelegramHandler:
     """Handles Telegram events and forwards messages to Discord"""
     
-    def __init__(self, telegram_client, discord_client):
+    def __init__(self, telegram_client, discord_client, media_cache=None, ledger=None, delivery=None):
         """
         Initialize the Telegram handler
         
         Args:
             telegram_client: Telethon client instance
             discord_client: Discord client instance
+            media_cache: Optional cache the forwarded media is stored in for approvals
+            ledger: Optional ForwardLedger used for dedupe and catch-up
+            delivery: DeliveryScheduler shared with the Discord handler (default: a new one)
         """
         self.telegram_client = telegram_client
         self.discord_client = discord_client
+        self.media_cache = media_cache
+        self.ledger = ledger
+        self.delivery = delivery or DeliveryScheduler(ledger)
+        self.delivery.register_replay('forward', self.replay_forward)
+        self.routes = self._build_routes()
+        self.approval_channels = {}  # channel_id -> discord channel
+        self.albums = AlbumAssembler(self._enqueue_album)
+        self.pipeline = ForwardPipeline()
+        self.batcher = EmbedBatcher(self._send_batch) if config.TEXT_BATCH_SECONDS > 0 else None
+        self.recompressor = ImageRecompressor() if config.RECOMPRESS_IMAGES and HAS_PILLOW else None
+        self.message_cache = LRUCache(config.MESSAGE_CACHE_SIZE, config.MESSAGE_CACHE_TTL)  # (chat_id, msg_id) -> (text, sender_name)
+        self.entity_cache = LRUCache(config.ENTITY_CACHE_SIZE, config.ENTITY_CACHE_TTL)  # entity id -> Telegram entity
 
         self.telegram_client.on(events.NewMessage(chats=config.MONITORED_CHATS))(
             self.handle_new_message
@@ -33,75 +74,333 @@ class TelegramHandler:
         Args:
             event: Telethon NewMessage event
         """
-        chat_id = event.chat_id
-        match chat_id:
-            case config.KOFI_FLYBOYS_ID:
-                approval_channel_id = config.APPROVAL_CHANNEL_FLYBOYS_ID
-            case config.KOFI_NEWS_ID:
-                approval_channel_id = config.APPROVAL_CHANNEL_NEWS_ID
-            case config.KOFI_PROVOZ_ID:
-                approval_channel_id = config.APPROVAL_CHANNEL_PROVOZ_ID
-                topic_id = None
-                if event.message.reply_to:
-                    topic_id = event.message.reply_to.reply_to_top_id or event.message.reply_to.reply_to_msg_id
-                # Ignore messages not in the specific topic
-                if topic_id != config.KOFI_PROVOZ_MAIN_ID:
-                    print("Message not in the main Provoz topic, ignoring.")
-                    return
-        
+        route = self.routes.get(event.chat_id)
+        if route is None:
+            return
+
+        if route.filter_topic:
+            topic_id = None
+            if event.message.reply_to:
+                topic_id = event.message.reply_to.reply_to_top_id or event.message.reply_to.reply_to_msg_id
+            # Ignore messages not in the specific topic
+            if topic_id != route.topic_id:
+                print(f"Message not in topic {route.topic_id} of chat {event.chat_id}, ignoring.")
+                return
+
         # Check existence of approval channel
-        approval_channel = await self.discord_client.fetch_channel(approval_channel_id)
+        approval_channel = await self._get_approval_channel(route.approval_channel_id)
         if not approval_channel:
-            print(f"Approval channel {approval_channel_id} not found! Please configure APPROVAL_CHANNEL_ID.")
+            print(f"Approval channel {route.approval_channel_id} not found! Please check config.CHAT_ROUTES.")
             return
 
+        # Skip messages that were already forwarded (or are being forwarded right now)
+        if self.ledger is not None and not self.ledger.claim(event.chat_id, event.message.id):
+            return
+
+        # Albums wait for their parts, earlier albums of the chat are queued
+        # before this message so forwards of one chat stay in order
+        await self.albums.flush_chat(event.chat_id, keep=event.message.grouped_id)
+
         # Handle grouped messages (albums)
         if event.message.grouped_id:
             await self._handle_grouped_message(event, approval_channel)
         else:
-            await self._handle_single_message(event, approval_channel)
+            # Forwards of one chat stay in order, different chats run in parallel
+            if not await self.pipeline.submit(event.chat_id, self._handle_single_message, event, approval_channel):
+                self._release([event])
+
+    def _build_routes(self):
+        """
+        Build the chat routing table from config
+        
+        Returns:
+            dict: chat_id -> ChatRoute
+        """
+        routes = {}
+        for chat_id, route in config.CHAT_ROUTES.items():
+            routes[chat_id] = ChatRoute(
+                approval_channel_id=route['approval_channel_id'],
+                color=route.get('color', config.DEFAULT_EMBED_COLOR),
+                filter_topic='topic_id' in route,
+                topic_id=route.get('topic_id'),
+            )
+        return routes
+
+    async def _get_approval_channel(self, channel_id):
+        """
+        Resolve an approval channel, preferring the gateway cache
+        
+        Args:
+            channel_id: Discord channel ID
+            
+        Returns:
+            discord channel or None if it does not exist
+        """
+        channel = self.approval_channels.get(channel_id)
+        if channel is not None:
+            return channel
+
+        channel = self.discord_client.get_channel(channel_id)
+        if channel is None:
+            # Not in the gateway cache yet, fall back to REST once
+            try:
+                channel = await self.discord_client.fetch_channel(channel_id)
+            except (discord.NotFound, discord.Forbidden) as e:
+                print(f"Could not fetch channel {channel_id}: {e}")
+                return None
+
+        self.approval_channels[channel_id] = channel
+        return channel
 
     async def _handle_grouped_message(self, event, approval_channel):
         """Handle messages that are part of a group (album)"""
-        # Download media to grouped folder
-        await event.message.download_media(
-            file=f"{config.DOWNLOADS_DIR}/message_{event.message.grouped_id}/"
-        )
+        # Parts are collected in memory and flushed once the album is complete
+        self.albums.add(event, approval_channel)
+
+    async def _enqueue_album(self, events, approval_channel):
+        """Queue an assembled album for forwarding"""
+        if not await self.pipeline.submit(events[0].chat_id, self._send_album, events, approval_channel):
+            self._release(events)
+
+    async def _send_album(self, events, approval_channel):
+        """
+        Send an assembled album to Discord
+        
+        Args:
+            events: Telethon message events of the album, ordered by message id
+            approval_channel: Discord channel to send to
+        """
+        # The caption is carried by one of the parts, usually the first
+        event = next((part for part in events if part.message.text), events[0])
+        try:
+            await self._send_message_to_discord(event, approval_channel, album=events)
+        finally:
+            self._release(events)
+
+    async def _handle_single_message(self, event, approval_channel):
+        """Handle single messages (not part of a group)"""
+        if self.batcher is not None and not event.message.media:
+            # Text-only, posted together with its neighbours, the batch releases the claim
+            try:
+                embed = await self._build_embed(event)
+            except BaseException:
+                self._release([event])
+                raise
+            self.batcher.add(approval_channel, embed, event)
+            return
+
+        try:
+            await self._send_message_to_discord(event, approval_channel)
+        finally:
+            self._release([event])
+
+    def _release(self, events):
+        """Release the ledger claims of events, so failed forwards can be retried"""
+        if self.ledger is not None:
+            for part in events:
+                self.ledger.release(part.chat_id, part.message.id)
+
+    async def close(self):
+        """
+        Finish the forwards in progress and stop the workers
         
-        # Check if this is the last message in the group
-        latest_message = await self.telegram_client.get_messages(
-            config.PERSONAL_ID, 
-            limit=1
+        Pending albums are queued, queued forwards get
+        config.FORWARD_SHUTDOWN_SECONDS to finish and pending text batches
+        are posted, so this must run while the Discord client is connected.
+        """
+        await self.albums.flush_all()
+        await self.pipeline.close(config.FORWARD_SHUTDOWN_SECONDS)
+        if self.batcher is not None:
+            await self.batcher.drain_all()
+        if self.recompressor is not None:
+            self.recompressor.close()
+
+    async def catch_up(self):
+        """
+        Forward messages posted while the bot was offline
+        
+        For every monitored chat, fetches the messages newer than the last
+        forwarded one and feeds them through the normal forwarding path,
+        which skips anything already recorded in the ledger. The last
+        config.CATCHUP_WINDOW message IDs below it are fetched as well, so
+        messages whose forward failed (or was still waiting in a batch at
+        shutdown) while later ones went through are not lost.
+        """
+        if self.ledger is None:
+            return
+
+        semaphore = asyncio.Semaphore(config.CATCHUP_CONCURRENCY)
+
+        async def catch_up_chat(chat_id):
+            seen = self.ledger.seen_range(chat_id)
+            if seen is None:
+                # Nothing forwarded yet, do not replay the whole history
+                return
+            first, last = seen
+            # Never reach back before the first forward, older history was not meant to be forwarded
+            min_id = max(first, last - config.CATCHUP_WINDOW)
+            async with semaphore:
+                count = 0
+                async for message in self.telegram_client.iter_messages(chat_id, min_id=min_id, reverse=True):
+                    if message.id > last or not self.ledger.is_forwarded(chat_id, message.id):
+                        await self.handle_new_message(MessageEvent(message))
+                        count += 1
+                if count:
+                    print(f"Caught up on {count} messages from chat {chat_id}")
+
+        results = await asyncio.gather(
+            *(catch_up_chat(chat_id) for chat_id in self.routes),
+            return_exceptions=True
         )
+        for chat_id, result in zip(self.routes, results):
+            if isinstance(result, Exception):
+                print(f"Catch-up for chat {chat_id} failed: {result!r}")
+
+    async def _send_message_to_discord(self, event, approval_channel, album=None):
+        """
+        Send message to Discord approval channel
         
-        is_last_in_group = (
-            latest_message[0].grouped_id == event.message.grouped_id and 
-            latest_message[0].id == event.message.id
+        Args:
+            event: Telethon message event
+            approval_channel: Discord channel to send to
+            album: All events of the album if this is a grouped message
+        """
+        embed = await self._build_embed(event, album)
+
+        # Batched text forwards of this channel go first, so the channel stays in order
+        if self.batcher is not None:
+            await self.batcher.drain(approval_channel.id)
+
+        # Handle media, every post is recorded and gets its reaction as soon as it is sent
+        await self._send_with_media(
+            event, 
+            approval_channel, 
+            embed, 
+            album
         )
         
-        if not is_last_in_group:
-            return  # Wait for the last message in the group
+        # Log the forwarding
+        print(f"Telegram message from {embed.title} forwarded to Discord approval channel")
+
+    async def _send_batch(self, channel, items):
+        """
+        Post a batch of text-only forwards as one message
+        
+        A single forward is posted as usual with the ✅ reaction, several get
+        one embed and approve button each.
         
-        # Process and send the grouped message
-        await self._send_message_to_discord(event, approval_channel, is_grouped=True)
+        Args:
+            channel: Discord approval channel
+            items: List of (embed, event) pairs in arrival order
+        """
+        events = [event for _, event in items]
+        try:
+            if len(items) == 1:
+                discord_message = await self._deliver_forward(channel, events, embed=items[0][0])
+            else:
+                embeds = []
+                for index, (embed, _) in enumerate(items):
+                    embed.set_footer(text=batch_footer(embed.footer.text, index))
+                    embeds.append(embed)
+                discord_message = await self._deliver_forward(
+                    channel, events, embeds=embeds, view=approval_view(range(len(embeds)))
+                )
 
-    async def _handle_single_message(self, event, approval_channel):
-        """Handle single messages (not part of a group)"""
-        await self._send_message_to_discord(event, approval_channel, is_grouped=False)
+            if self.ledger is not None:
+                for index, event in enumerate(events):
+                    self.ledger.record_forward(event.chat_id, [event.message.id], None, discord_message.id, index)
 
-    async def _send_message_to_discord(self, event, approval_channel, is_grouped=False):
+            if len(items) == 1:
+                await self._add_approval_reaction(discord_message)
+                print(f"Telegram message from {items[0][0].title} forwarded to Discord approval channel")
+            else:
+                print(f"{len(items)} Telegram messages forwarded to Discord approval channel in one post")
+        finally:
+            self._release(events)
+
+    async def _deliver_forward(self, channel, events, **kwargs):
         """
-        Send message to Discord approval channel
+        Post a forward to an approval channel through the delivery scheduler
+        
+        Transient failures are retried; if the post keeps failing, the source
+        messages are stored as a dead letter that /replay-failed forwards again.
+        
+        Args:
+            channel: Discord approval channel
+            events: Telethon message events the post forwards
+            **kwargs: Arguments of channel.send
+            
+        Returns:
+            discord.Message: Sent Discord message
+        """
+        files = kwargs.get('files', [])
+
+        async def send():
+            for file in files:
+                file.reset()  # Rewind what a failed attempt already read
+            return await channel.send(**kwargs)
+
+        first = events[0]
+        return await self.delivery.deliver(
+            ('messages', channel.id),
+            send,
+            key=f"forward:{first.chat_id}:{first.message.id}",
+            dead_letter=('forward', {'messages': [[part.chat_id, part.message.id] for part in events]}),
+        )
+
+    async def _add_approval_reaction(self, discord_message):
+        """Add the ✅ reaction, a missing one only means the approver has to add it"""
+        try:
+            await self.delivery.deliver(
+                ('reactions', discord_message.channel.id),
+                lambda: discord_message.add_reaction("✅"),
+                priority=PRIORITY_REACTION,
+            )
+        except DeliveryFailed as e:
+            print(f"Could not add the approval reaction: {e}")
+
+    async def replay_forward(self, payload):
+        """
+        Forward the messages of a dead letter again
+        
+        The messages are fetched fresh from Telegram and go through the
+        normal path, so anything forwarded in the meantime is skipped.
+        
+        Args:
+            payload: {'messages': [[chat_id, message_id], ...]}
+        """
+        chats = {}
+        for chat_id, message_id in payload['messages']:
+            chats.setdefault(chat_id, []).append(message_id)
+        for chat_id, message_ids in chats.items():
+            messages = await self.telegram_client.get_messages(chat_id, ids=message_ids)
+            for message in messages:
+                if message is not None:
+                    await self.handle_new_message(MessageEvent(message))
+
+    async def _build_embed(self, event, album=None):
+        """
+        Build the approval embed of a message, resolving its sender, chat and reply target
         
         Args:
             event: Telethon message event
-            approval_channel: Discord channel to send to
-            is_grouped: Whether this is a grouped message (album)
+            album: All events of the album if this is a grouped message
+            
+        Returns:
+            discord.Embed: Approval embed
         """
         # Get message details
         message_text = event.message.text or "[No text content]"
-        sender = await event.get_sender()
-        chat = await event.get_chat()
+        sender = await self._get_entity(event.sender_id, event.get_sender)
+        chat = await self._get_entity(event.chat_id, event.get_chat)
+
+        # Remember the message so replies to it can be resolved from memory
+        sender_name = self._get_sender_name(sender)
+        for part in album or [event]:
+            self.message_cache.set(
+                (part.chat_id, part.message.id),
+                (part.message.text, sender_name)
+            )
 
         topic_id = None
         if event.message.reply_to:
@@ -119,39 +418,70 @@ class TelegramHandler:
         original_sender_name = None
 
         if is_real_reply:
-            try:
-                original_msg = await self.telegram_client.get_messages(
-                    await event.get_chat(),
-                    ids=event.message.reply_to.reply_to_msg_id
-                )
-                if original_msg:
-                    original_text = original_msg.text or "[Media / No text]"
-                    original_sender = await original_msg.get_sender()
-                    original_sender_name = self._get_sender_name(original_sender)
-            except Exception as e:
-                print(f"Could not fetch original message: {e}")
+            original = await self._get_reply_target(event, chat)
+            if original:
+                original_text = original[0] or "[Media / No text]"
+                original_sender_name = original[1]
 
         # Create embed
-        embed = self._create_embed(event, message_text, sender, chat, original_text, original_sender_name)
-        
-        # Handle media
-        discord_message = await self._send_with_media(
-            event, 
-            approval_channel, 
-            embed, 
-            is_grouped
-        )
-        
-        # Add approval reaction
-        await discord_message.add_reaction("✅")
+        return self._create_embed(event, message_text, sender, chat, original_text, original_sender_name)
+
+    async def _get_entity(self, entity_id, fetch):
+        """
+        Get a sender or chat entity through the entity cache
         
-        # Cleanup downloads
-        if os.path.exists(config.DOWNLOADS_DIR):
-            shutil.rmtree(config.DOWNLOADS_DIR)
+        Args:
+            entity_id: Telegram peer ID
+            fetch: Coroutine function returning the entity on a cache miss
+            
+        Returns:
+            Telegram entity
+        """
+        entity = self.entity_cache.get(entity_id)
+        if entity is None:
+            entity = await fetch()
+            if entity is not None and entity_id is not None:
+                self.entity_cache.set(entity_id, entity)
+        return entity
+
+    async def _get_reply_target(self, event, chat):
+        """
+        Get text and sender name of the message being replied to
         
-        # Log the forwarding
-        sender_name = self._get_sender_name(sender)
-        print(f"Telegram message from {sender_name} forwarded to Discord approval channel")
+        Args:
+            event: Telethon message event that is a reply
+            chat: Chat where the message was sent
+            
+        Returns:
+            tuple: (text, sender_name) or None if it could not be fetched
+        """
+        key = (event.chat_id, event.message.reply_to.reply_to_msg_id)
+        original = self.message_cache.get(key)
+        if original is not None:
+            return original
+
+        try:
+            original_msg = await self.telegram_client.get_messages(
+                chat,
+                ids=event.message.reply_to.reply_to_msg_id
+            )
+            if not original_msg:
+                return None
+            original_sender = await self._get_entity(original_msg.sender_id, original_msg.get_sender)
+            original = (original_msg.text, self._get_sender_name(original_sender))
+        except Exception as e:
+            print(f"Could not fetch original message: {e}")
+            return None
+
+        self.message_cache.set(key, original)
+        return original
+
+    def cache_stats(self):
+        """Return hit/miss counters of the Telegram lookup caches"""
+        return {
+            'messages': self.message_cache.stats(),
+            'entities': self.entity_cache.stats(),
+        }
 
     def _create_embed(self, event, message_text, sender, chat, original_text=None, original_sender_name=None):
         """
@@ -166,16 +496,8 @@ class TelegramHandler:
         Returns:
             discord.Embed: Formatted embed
         """
-        chat_id = event.chat_id
-        match chat_id:
-            case config.KOFI_FLYBOYS_ID:
-                color = 0x0088cc
-            case config.KOFI_NEWS_ID:
-                color = 0x8800cc
-            case config.KOFI_PROVOZ_ID:
-                color = 0xcc8800
-            case _:
-                color = 0x00cc88
+        route = self.routes.get(event.chat_id)
+        color = route.color if route else config.DEFAULT_EMBED_COLOR
 
         embed = discord.Embed(
             title=self._get_sender_name(sender),
@@ -226,61 +548,148 @@ class TelegramHandler:
         
         return chat_name
     
-    async def _send_with_media(self, event, channel, embed, is_grouped):
+    async def _send_with_media(self, event, channel, embed, album=None):
         """
         Send message to Discord with media attachments
         
+        The sizes are checked before downloading: images over the channel's
+        upload limit are recompressed, other media over it is posted as a
+        thumbnail or only linked, and albums that exceed the limit are split
+        over several posts. Every post is recorded in the ledger and gets
+        its ✅ reaction right after it is sent, so a post that fails later
+        does not undo the earlier ones.
+        
         Args:
             event: Telethon message event
             channel: Discord channel
             embed: Discord embed
-            is_grouped: Whether this is a grouped message
+            album: All events of the album if this is a grouped message
             
         Returns:
-            discord.Message: Sent Discord message
-        """
-        if not event.message.media:
-            # No media, just send embed
-            return await channel.send(embed=embed)
+            discord.Message: First sent Discord message
         
-        if is_grouped:
-            # Handle grouped media (album)
-            file_path = f"{config.DOWNLOADS_DIR}/message_{event.message.grouped_id}"
-            files = self._prepare_files(file_path)
-            return await channel.send(embed=embed, files=files)
-        else:
-            # Handle single media file
-            file_path = f"{config.DOWNLOADS_DIR}/message_{event.message.id}"
-            await event.message.download_media(file=f"{file_path}/")
-            
-            filename = listdir(file_path)[0]
-            # Fix hidden files (starting with .)
-            if filename[0] == ".":
-                os.rename(f"{file_path}/{filename}", f"{file_path}/prefix{filename}")
-                filename = f"prefix{filename}"
-            
-            file = discord.File(f"{file_path}/{filename}")
-            return await channel.send(embed=embed, file=file)
-    
-    def _prepare_files(self, file_path):
+        Raises:
+            DeliveryFailed: If a post failed for good, after the other posts were sent
         """
-        Prepare Discord file attachments from a directory
-        
-        Args:
-            file_path: Path to directory containing files
-            
+        events = album or [event]
+        limit = upload_limit(channel)
+        shrink_target = min(config.RECOMPRESS_TARGET_BYTES, limit) if self.recompressor is not None else None
+        posts, skipped = plan_media([part.message for part in events], limit, shrink_target=shrink_target)
+
+        if not posts:
+            # No media to upload, just send embed
+            if skipped:
+                embed.add_field(name="📎 Too large for Discord", value=describe_skipped(skipped), inline=False)
+            discord_message = await self._deliver_forward(channel, events, embed=embed)
+            await self._record_post(discord_message, events)
+            return discord_message
+
+        later_ids = {message.id for post in posts[1:] for message, _ in post}
+        first_message = None
+        failure = None
+        for number, post in enumerate(posts):
+            # Each post stands for its own parts, the first one also for those that only got a link
+            if number == 0:
+                post_events = [part for part in events if part.message.id not in later_ids]
+            else:
+                post_ids = {message.id for message, _ in post}
+                post_events = [part for part in events if part.message.id in post_ids]
+
+            files = []
+            total_size = 0
+            # Media that is only linked, or only attached as its preview
+            omitted = list(skipped) if number == 0 else []
+            previews = []
+            for message, how in post:
+                if how == 'shrink':
+                    file, how = await self._download_shrunk(message, shrink_target)
+                else:
+                    file = await download_media_file(message, thumbnail=how == 'thumb')
+                if file is None:
+                    omitted.append(message)
+                    continue
+                files.append(file)
+                if how == 'file':
+                    total_size += message.file.size or 0
+                elif how == 'shrink':
+                    total_size += shrink_target
+                else:
+                    previews.append(message)
+
+            if number == 0:
+                post_embed = embed
+            else:
+                post_embed = discord.Embed(
+                    title=embed.title,
+                    description=f"📎 Album continued ({number + 1}/{len(posts)})",
+                    color=embed.color
+                )
+                post_embed.set_footer(text=embed.footer.text)
+            if omitted or previews:
+                post_embed.add_field(
+                    name="📎 Too large for Discord", value=describe_skipped(omitted, previews), inline=False
+                )
+
+            # Keep the bytes so approving does not download the attachments again. Reading
+            # them pulls spooled files into memory, so only small posts are cached.
+            payload = None
+            if self.media_cache is not None and total_size <= config.MEDIA_CACHE_MAX_ENTRY_BYTES:
+                payload = [read_file_payload(file) for file in files]
+
+            try:
+                discord_message = await self._deliver_forward(channel, post_events, embed=post_embed, files=files)
+            except DeliveryFailed as e:
+                # Dead-lettered with its own parts, the remaining posts still go out
+                failure = failure or e
+                continue
+            if payload:
+                self.media_cache.set(discord_message.id, payload)
+
+            await self._record_post(discord_message, post_events)
+            if first_message is None:
+                first_message = discord_message
+
+        if failure is not None:
+            raise failure
+        return first_message
+
+    async def _record_post(self, discord_message, events):
+        """Record the messages of a sent post in the ledger, then add its ✅ reaction"""
+        if self.ledger is not None:
+            first = events[0]
+            self.ledger.record_forward(
+                first.chat_id,
+                [part.message.id for part in events],
+                first.message.grouped_id,
+                discord_message.id
+            )
+        # Added only once recorded, so an approval always finds the ledger entry
+        await self._add_approval_reaction(discord_message)
+
+    async def _download_shrunk(self, message, target_bytes):
+        """
+        Download an oversized image and recompress it to fit target_bytes
+
+        Falls back to the Telegram thumbnail if the image cannot be shrunk
+        within the recompressor's CPU budget.
+
         Returns:
-            list[discord.File]: List of Discord file objects
+            tuple: (discord.File or None, 'shrink' or 'thumb' for how it was posted)
         """
-        all_files = [f for f in listdir(file_path) if isfile(join(file_path, f))]
-        files = []
-        
-        for filename in all_files:
-            # Fix hidden files (starting with .)
-            if filename[0] == ".":
-                os.rename(f"{file_path}/{filename}", f"{file_path}/prefix{filename}")
-                filename = f"prefix{filename}"
-            
-            files.append(discord.File(f"{file_path}/{filename}"))
-        
-        return files
\ No newline at end of file
+        file = await download_media_file(message)
+        if file is None:
+            return None, 'shrink'
+        filename, data = read_file_payload(file)
+        file.close()
+
+        result = await self.recompressor.shrink(data, target_bytes)
+        if result is not None:
+            shrunk, extension = result
+            print(f"Recompressed {filename} from {len(data) / (1024 * 1024):.1f} MB "
+                  f"to {len(shrunk) / (1024 * 1024):.1f} MB")
+            return discord.File(io.BytesIO(shrunk), filename=f"{filename.rsplit('.', 1)[0]}{extension}"), 'shrink'
+
+        print(f"Could not recompress {filename}, posting its preview")
+        if thumbnail_size(message) is None:
+            return None, 'thumb'
+        return await download_media_file(message, thumbnail=True), 'thumb'
@@ -0,0 +1,156 @@
+"""
+Recompression of images that are too large for Discord
+
+Images are downsized and re-encoded along a JPEG/WebP quality ladder in a
+process pool, so the event loop never blocks on image work. Pillow is an
+optional dependency; without it the stage is disabled.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import config
+from cache import LRUCache
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+QUALITY_LADDER = (85, 75, 65, 50, 35)
+FORMATS = ("JPEG", "WEBP")  # Tried in this order at every quality step
+EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+DOWNSCALE_STEP = 0.75  # Size factor applied when even the lowest quality is too large
+MIN_DIMENSION = 64
+
+
+def recompress(data, target_bytes, cpu_budget, max_dimension):
+    """
+    Re-encode an image until it fits target_bytes (runs in a worker process)
+
+    The image is first bounded to max_dimension, then every quality of the
+    ladder is tried in every format; if nothing fits, the image is scaled
+    down and the ladder starts over.
+
+    Args:
+        data: Encoded image bytes
+        target_bytes: Maximum size of the result
+        cpu_budget: CPU seconds after which the job gives up
+        max_dimension: Maximum width and height of the result
+
+    Returns:
+        tuple: (bytes, extension) or None if it could not be shrunk within budget
+    """
+    from PIL import Image, ImageOps
+
+    started = time.process_time()
+    image = Image.open(io.BytesIO(data))
+    # Lets JPEGs decode at a reduced scale, a no-op for other formats
+    image.draft("RGB", (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(image)
+
+    # Neither output keeps transparency reliably, flatten onto white
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    while True:
+        for quality in QUALITY_LADDER:
+            for image_format in FORMATS:
+                if time.process_time() - started > cpu_budget:
+                    return None
+                out = io.BytesIO()
+                image.save(out, image_format, quality=quality)
+                if out.tell() <= target_bytes:
+                    return out.getvalue(), EXTENSIONS[image_format]
+
+        width, height = int(image.width * DOWNSCALE_STEP), int(image.height * DOWNSCALE_STEP)
+        if min(width, height) < MIN_DIMENSION:
+            return None
+        image = image.resize((width, height), Image.LANCZOS)
+
+
+class ImageRecompressor:
+    """
+    Shrinks images in a process pool, caching results by content hash
+
+    Identical images (e.g. the same photo posted to several monitored
+    chats) are only recompressed once, also while a job for them is
+    still running.
+    """
+
+    def __init__(self, workers=config.RECOMPRESS_WORKERS,
+                 cpu_budget=config.RECOMPRESS_CPU_SECONDS,
+                 max_dimension=config.RECOMPRESS_MAX_DIMENSION,
+                 cache_size=config.RECOMPRESS_CACHE_SIZE,
+                 cache_max_bytes=config.RECOMPRESS_CACHE_MAX_BYTES):
+        """
+        Initialize the recompressor
+
+        Args:
+            workers: Number of worker processes
+            cpu_budget: CPU seconds a single image may take
+            max_dimension: Maximum width and height of a recompressed image
+            cache_size: Maximum number of cached results
+            cache_max_bytes: Maximum total size of cached results
+        """
+        self.workers = workers
+        self.cpu_budget = cpu_budget
+        self.max_dimension = max_dimension
+        self.executor = None  # Started on first use
+        self.cache = LRUCache(
+            cache_size,
+            max_weight=cache_max_bytes,
+            weigh=lambda result: len(result[0]) if result else 1,
+        )  # (content hash, target) -> (bytes, extension) or None
+        self.pending = {}  # (content hash, target) -> future of the running job
+
+    async def shrink(self, data, target_bytes):
+        """
+        Recompress image bytes to at most target_bytes
+
+        Returns:
+            tuple: (bytes, extension) or None if the image could not be shrunk
+        """
+        key = (hashlib.blake2b(data, digest_size=16).digest(), target_bytes)
+        if key in self.cache:
+            return self.cache.get(key)
+        job = self.pending.get(key)
+        if job is None:
+            job = self.pending[key] = asyncio.create_task(self._run(key, data, target_bytes))
+        # Shielded, a cancelled caller does not abort the job for the others
+        return await asyncio.shield(job)
+
+    async def _run(self, key, data, target_bytes):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(), recompress, data, target_bytes, self.cpu_budget, self.max_dimension
+            )
+        except Exception as e:
+            print(f"Image recompression failed: {e!r}")
+            result = None
+        finally:
+            self.pending.pop(key, None)
+        self.cache.set(key, result)
+        return result
+
+    def _get_executor(self):
+        if self.executor is None:
+            # Spawned, forking a process that runs an event loop and threads is not safe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self.executor
+
+    def close(self):
+        """Shut the worker processes down"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None